@@ -2,80 +2,213 @@ import requests
 from bs4 import BeautifulSoup
 import pandas as pd
 import re
+import math
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 import streamlit as st
 
-def get_nutritional_data(url):
+HEADERS = {
+    'User-Agent': (
+        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+        'AppleWebKit/537.36 (KHTML, like Gecko) '
+        'Chrome/112.0.0.0 Safari/537.36'
+    )
+}
+
+def get_nutritional_data(url, session=None):
     """
     Scrapes nutritional information from a Colruyt product page and returns it as a DataFrame.
     
     Parameters:
         url (str): The URL of the product page.
+        session (requests.Session, optional): Session to reuse connections, a plain requests.get otherwise.
     
     Returns:
         pd.DataFrame: A DataFrame with two columns: 'Nutrition' and 'Value'.
     """
     # Send a GET request to the website
-    headers = {
-        'User-Agent': (
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-            'AppleWebKit/537.36 (KHTML, like Gecko) '
-            'Chrome/112.0.0.0 Safari/537.36'
-        )
-    }
     try:
-        response = requests.get(url, headers=headers,timeout=10)
+        response = (session or requests).get(url, headers=HEADERS, timeout=10)
         
         # Check if the request was successful
-        if response.status_code == 200:
-            # Parse the page content
-            soup = BeautifulSoup(response.text, 'html.parser')
-        else:
+        if response.status_code != 200:
             print(f"❌ Error scraping {url}: Unable to fetch data.")
             return pd.DataFrame(columns=['Nutrition', 'Value'])
-        
-        # Find the section with nutritional info
-        voedingswaarden = soup.find('div', id='voedingswaarden')
-    
-        if voedingswaarden:
-            data = []
-            # Find all nutrient entries
-            details = voedingswaarden.find_all('div', class_='value-detail')[:11]  # Get the first 11 items
-            energie_kj_count = 0  # To track the occurrence of "Energie kJ"
-
-            for detail in details:
-                name = detail.find('span', class_='val-name')
-                value = detail.find('span', class_='val-nbr')
-
-                if name and value:
-                    raw_value = value.text.strip()
-
-                    # Check if the value starts with "< .", and if so, fix it
-                    if raw_value.startswith("< ."):
-                        raw_value = "0" + raw_value[2:]  # Fix the < . to 0.
-                    if raw_value.startswith("< 0."):
-                        raw_value =  raw_value[2:]  # Fix the < 0. to 0.
-
-                    # Clean the nutrient name and value
-                    nutrient_clean = name.text.strip()
-                    value_clean = re.sub(r'\s*(kJ|kcal|g)$', '', raw_value).strip()  # Remove units (kJ, kcal, g)
-
-                    # If we encounter "Energie kJ", increment the counter
-                    if nutrient_clean == "Energie kJ":
-                        energie_kj_count += 1
-                        # Skip the second and any subsequent "Energie kJ"
-                        if energie_kj_count == 2:
-                            break
-
-                    # Append cleaned data as a tuple
-                    data.append((nutrient_clean, value_clean))
-
-            # Convert the cleaned data into a DataFrame
-            df = pd.DataFrame(data, columns=['Nutrition', 'Value'])
-            return df
-        else:
-            # print("❌ Could not find the 'VOEDINGSWAARDEN' section.")
-            return pd.DataFrame(columns=['Nutrition', 'Value'])
+        return parse_nutritional_data(response.text)
     except Exception as e:
         st.warning(f"❌ Exception while scraping {url}: {e}")
         return pd.DataFrame(columns=['Nutrition', 'Value'])
-        
\ No newline at end of file
+
+def parse_nutritional_data(html):
+    """Nutrition/Value DataFrame from the HTML of a Colruyt product page (empty if there is no nutrition section)"""
+    # Parse the page content
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Find the section with nutritional info
+    voedingswaarden = soup.find('div', id='voedingswaarden')
+
+    if voedingswaarden:
+        data = []
+        # Find all nutrient entries
+        details = voedingswaarden.find_all('div', class_='value-detail')[:11]  # Get the first 11 items
+        energie_kj_count = 0  # To track the occurrence of "Energie kJ"
+
+        for detail in details:
+            name = detail.find('span', class_='val-name')
+            value = detail.find('span', class_='val-nbr')
+
+            if name and value:
+                raw_value = value.text.strip()
+
+                # Check if the value starts with "< .", and if so, fix it
+                if raw_value.startswith("< ."):
+                    raw_value = "0" + raw_value[2:]  # Fix the < . to 0.
+                if raw_value.startswith("< 0."):
+                    raw_value =  raw_value[2:]  # Fix the < 0. to 0.
+
+                # Clean the nutrient name and value
+                nutrient_clean = name.text.strip()
+                value_clean = re.sub(r'\s*(kJ|kcal|g)$', '', raw_value).strip()  # Remove units (kJ, kcal, g)
+
+                # If we encounter "Energie kJ", increment the counter
+                if nutrient_clean == "Energie kJ":
+                    energie_kj_count += 1
+                    # Skip the second and any subsequent "Energie kJ"
+                    if energie_kj_count == 2:
+                        break
+
+                # Append cleaned data as a tuple
+                data.append((nutrient_clean, value_clean))
+
+        # Convert the cleaned data into a DataFrame
+        df = pd.DataFrame(data, columns=['Nutrition', 'Value'])
+        return df
+    else:
+        # print("❌ Could not find the 'VOEDINGSWAARDEN' section.")
+        return pd.DataFrame(columns=['Nutrition', 'Value'])
+
+def get_kcal_prot(data):
+    """(kcal_100g, prot_100g) from get_nutritional_data output, kcal from kJ when kcal is missing, NaN when unknown"""
+    values = dict(zip(data['Nutrition'], data['Value']))
+    def number(name):
+        try:
+            return float(str(values[name]).replace(",", "."))
+        except (KeyError, ValueError):
+            return float('nan')
+    kcal = number('Energie kcal')
+    if math.isnan(kcal):
+        kcal = number('Energie kJ') / 4.184
+    return kcal, number('Eiwitten')
+
+
+# BATCH SCRAPING
+# One pooled Session (keep-alive, connection reuse) shared by a bounded thread pool. Requests to the same host are
+# spaced by a per host rate limit, failed requests (connection errors, 429 and 5xx) are retried with exponential backoff.
+class HostRateLimiter:
+    """At most `rate` requests per second per host, shared by all threads"""
+    def __init__(self, rate=2.0):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}     # host => monotonic time of the next free slot
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def create_session(pool_size=8):
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def fetch_with_retries(session, url, limiter=None, retries=3, backoff=0.5, timeout=10):
+    """(response or None, attempts, error) for url, retrying connection errors and RETRY_STATUS responses"""
+    error = None
+    for attempt in range(1, retries + 2):
+        if limiter is not None:
+            limiter.wait(url)
+        try:
+            response = session.get(url, timeout=timeout)
+            if response.status_code not in RETRY_STATUS:
+                return response, attempt, None
+            error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+        if attempt <= retries:
+            time.sleep(backoff * 2 ** (attempt - 1))
+    return None, retries + 1, error
+
+def as_url_items(urls):
+    # {ingredient: url}, or a list of {ingredient: url} like scrape_all_prices takes
+    if isinstance(urls, dict):
+        return list(urls.items())
+    return [item for mapping in urls for item in mapping.items()]
+
+def scrape_nutrition_batch(urls, max_workers=8, rate_per_host=4.0, retries=3, backoff=0.5, timeout=10, session=None,
+                           cache=None):
+    """
+    Scrapes the nutritional data of many product pages concurrently.
+
+    Parameters:
+        urls: {ingredient: url} or a list of {ingredient: url}. Empty urls are not requested.
+        max_workers (int): Concurrent requests (and size of the connection pool).
+        rate_per_host (float): Max requests per second to one host.
+        retries (int), backoff (float): Retries of a failed request, waiting backoff * 2**n seconds in between.
+        session (requests.Session, optional): Session to use instead of a new pooled one.
+        cache (ScrapeCache, optional): On-disk page cache, pages are then only requested when older than the
+            'nutrition' TTL (and revalidated with a conditional request). The cache counts are printed at the end.
+
+    Returns:
+        pd.DataFrame indexed by Ingredient with columns url, kcal_100g, prot_100g, status ('ok', 'no data',
+        'http <code>', 'failed' or 'no url'), attempts and error.
+    """
+    items = as_url_items(urls)
+    own_session = session is None
+    session = session or create_session(max_workers)
+    limiter = HostRateLimiter(rate_per_host)
+    if cache is not None:
+        # Rate limited inside the cache, only requests that reach the server wait
+        fetcher, limiter = cache.wrap(session, "nutrition", throttle=limiter.wait), None
+    else:
+        fetcher = session
+
+    def scrape(item):
+        ingredient, url = item
+        url = "" if url is None or (isinstance(url, float) and math.isnan(url)) else str(url).strip()
+        row = {"Ingredient": ingredient, "url": url, "kcal_100g": float('nan'), "prot_100g": float('nan'),
+               "status": "no url", "attempts": 0, "error": None}
+        if not url:
+            return row
+        response, row["attempts"], row["error"] = fetch_with_retries(fetcher, url, limiter, retries, backoff, timeout)
+        if response is None:
+            row["status"] = "failed"
+        elif response.status_code != 200:
+            row["status"] = f"http {response.status_code}"
+        else:
+            data = parse_nutritional_data(response.text)
+            row["kcal_100g"], row["prot_100g"] = get_kcal_prot(data)
+            row["status"] = "ok" if not data.empty else "no data"
+        return row
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            rows = list(pool.map(scrape, items))
+    finally:
+        if own_session:
+            session.close()
+    df = pd.DataFrame(rows, columns=["Ingredient", "url", "kcal_100g", "prot_100g", "status", "attempts", "error"])
+    df = df.set_index("Ingredient")
+    if cache is not None:
+        df.attrs["cache"] = fetcher.report()
+    return df
@@ -1,7 +1,5 @@
 import requests
-from bs4 import BeautifulSoup
 import pandas as pd
-import re
 
 from selenium import webdriver
 from webdriver_manager.chrome import ChromeDriverManager
@@ -10,8 +8,20 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from selenium_stealth import stealth
 import time
+import os
+import csv
+import queue
+import threading
+import tempfile
+from html.parser import HTMLParser
+try:
+    from .colruyt_scraper import create_session
+except ImportError:
+    # Imported as a top-level module (Colruyt_scraping on sys.path, see main.py) or run as a script
+    from colruyt_scraper import create_session
 
 #pip install webdriver_manager
 #pip install selenium-stealth
@@ -38,44 +48,102 @@ def create_driver():
     return driver
 
 
-def get_price(driver, url):
+# Price spans, in order of preference
+PRICE_CLASSES = [
+    "product__price__volume-price",
+    "product__price__final-price",
+    "product__price__kilo-price"
+]
+
+class PriceSpanParser(HTMLParser):
+    # Text of the first span of each PRICE_CLASSES class (like BeautifulSoup's get_text(strip=True))
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.texts = {}
+        self.current = None     # [class name, text parts, depth of nested tags]
+
+    def handle_starttag(self, tag, attrs):
+        if self.current is not None:
+            self.current[2] += 1
+        elif tag == "span":
+            classes = (dict(attrs).get("class") or "").split()
+            for class_name in PRICE_CLASSES:
+                if class_name in classes and class_name not in self.texts:
+                    self.current = [class_name, [], 0]
+                    break
+
+    def handle_endtag(self, tag):
+        if self.current is None:
+            return
+        if self.current[2]:
+            self.current[2] -= 1
+        else:
+            self.texts[self.current[0]] = "".join(self.current[1])
+            self.current = None
+
+    def handle_data(self, data):
+        if self.current is not None:
+            self.current[1].append(data.strip())
+
+def parse_price(html):
+    """Price (str) from the first price span in PRICE_CLASSES order, None when the HTML has no price"""
+    # Skip everything before the first price span, the page head and menus are most of the HTML
+    first = html.find("product__price__")
+    if first < 0:
+        return None
+    parser = PriceSpanParser()
+    parser.feed(html[html.rfind("<", 0, first):])
+    parser.close()
+    for class_name in PRICE_CLASSES:
+        if class_name in parser.texts:
+            return parser.texts[class_name].replace("€\xa0", "").replace(",", ".")
+    return None
+
+def fetch_page(session, url, timeout=10):
+    # Response of a plain HTTP fetch, None on a connection error or a non-200 answer
     try:
-        driver.get(url)
+        response = session.get(url, timeout=timeout)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    if "charset" not in response.headers.get("Content-Type", ""):
+        response.encoding = "utf-8"     # requests falls back to ISO-8859-1, which mangles the € sign
+    return response
 
-        # Wait until some main product container is visible
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "product-detail__info"))
-        )
+def fetch_price_http(session, url, timeout=10):
+    # Fast path: the price from the static HTML, None when it is not there (rendered by JS, blocked, ...)
+    response = fetch_page(session, url, timeout)
+    return parse_price(response.text) if response is not None else None
 
-        soup = BeautifulSoup(driver.page_source, "html.parser")
+def fetch_price(driver, url, timeout=10):
+    # get_price without the error handling: raises TimeoutException when the page has no product and
+    # WebDriverException when the driver itself fails
+    driver.get(url)
 
-        # Try all relevant price classes in order
-        for class_name in [
-            "product__price__volume-price",
-            "product__price__final-price",
-            "product__price__kilo-price"
-        ]:
-            price_span = soup.find("span", class_=class_name)
-            if price_span:
-                return price_span.get_text(strip=True).replace("€\xa0", "").replace(",", ".")
+    # Wait until some main product container is visible
+    WebDriverWait(driver, timeout).until(
+        EC.presence_of_element_located((By.CLASS_NAME, "product-detail__info"))
+    )
 
-        return 0
+    return parse_price(driver.page_source) or 0
+
+
+def get_price_http_first(driver, url, session):
+    """(price, path): the price from a plain HTTP fetch (path 'http'), or from the browser like get_price when
+    the static HTML has no price (path 'browser')"""
+    price = fetch_price_http(session, url)
+    if price is not None:
+        return price, "http"
+    return get_price(driver, url), "browser"
+
+
+def get_price(driver, url):
+    try:
+        return fetch_price(driver, url)
     except Exception as e:
         print(f"Error getting price for {url}: {e}")
         return 0
-    # try:
-    #     WebDriverWait(driver, 10).until(
-    #         EC.presence_of_element_located((By.CLASS_NAME, "product__price__volume-price"))
-    #     )
-    #     soup = BeautifulSoup(driver.page_source, "html.parser")
-    #     price_span = soup.find("span", class_="product__price__volume-price")
-    #     if price_span:
-    #         return price_span.get_text(strip=True).replace("€\xa0", "")
-    #     else:
-    #         return 0
-    # except Exception as e:
-    #     print(f"Error getting price for {url}: {e}")
-    #     return 0
 
 
 def scrape_all_prices(urls, save_path):
@@ -95,3 +163,287 @@ def scrape_all_prices(urls, save_path):
     df = pd.DataFrame(data)
     df.to_excel(save_path, index=False)
     return df
+
+
+# PARALLEL SCRAPING
+# scrape_all_prices drives one browser with a fixed 1 s pause per URL. scrape_all_prices_parallel runs `workers`
+# drivers on a shared queue of URLs. The pause between page loads adapts to how the site responds (AdaptiveDelay),
+# a driver that crashes is replaced and its URL queued again, and every price is appended to a CSV journal as soon as
+# it is known, so an interrupted run keeps what it scraped.
+class AdaptiveDelay:
+    """Politeness delay shared by all workers, in the spirit of Scrapy's AutoThrottle.
+    Page loads (over all workers) start at least `delay` apart. The delay follows the page load time divided by
+    target_concurrency, i.e. about target_concurrency pages are loading at any time: a slower site gets longer pauses.
+    It is doubled after an error and stays between min_delay and max_delay.
+    The spacing, not the number of drivers, sets the throughput: at most target_concurrency pages load at the same
+    time, and never more than 1 / min_delay page loads start per second."""
+    def __init__(self, start_delay=1.0, min_delay=0.25, max_delay=30.0, target_concurrency=2.0):
+        self.delay = start_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.target_concurrency = target_concurrency
+        self.lock = threading.Condition()
+        self.last_start = None
+
+    def wait(self):
+        # Waits against the current delay, so a delay lowered meanwhile also shortens the waits in progress
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                if self.last_start is None or now >= self.last_start + self.delay:
+                    self.last_start = now
+                    return
+                self.lock.wait(self.last_start + self.delay - now)
+
+    def record(self, latency, ok=True):
+        with self.lock:
+            if ok:
+                target = latency / self.target_concurrency
+                # Move halfway towards the target, errors never shorten the delay
+                self.delay = (self.delay + max(target, self.min_delay)) / 2
+            else:
+                self.delay = self.delay * 2
+            self.delay = min(max(self.delay, self.min_delay), self.max_delay)
+            self.lock.notify_all()
+
+
+def scrape_all_prices_parallel(urls, save_path, workers=4, driver_factory=create_driver, delay=None,
+                               max_attempts=3, page_timeout=10, http_first=True, cache=None, journal_path=None):
+    """
+    scrape_all_prices with a pool of drivers.
+    With http_first, each page is first fetched over plain HTTP (one pooled session for all workers) and the browser
+    is only used when the static HTML has no price. Drivers are started on first use, so a run where every price is
+    in the static HTML starts no browser.
+
+    Parameters:
+        urls: list of {ingredient: url} (as for scrape_all_prices), or a {ingredient: url} dict.
+        save_path (str): Excel file with columns Ingredient, url, price, source (in the order of urls), None to only
+            return the results. While running, results are appended to journal_path (save_path + ".partial.csv"
+            by default, a temp file without save_path). A journal_path given with save_path=None is left in place
+            for the caller to remove once it saved the results.
+        workers (int): Number of drivers (browsers) running at the same time.
+        driver_factory: Callable returning a new driver, create_driver by default.
+        delay (AdaptiveDelay, optional): Shared politeness delay. By default AdaptiveDelay(target_concurrency=workers),
+            so the workers can all be loading a page. A delay with a lower target_concurrency leaves drivers idle.
+        max_attempts (int): Tries of a URL whose driver crashed before its price is recorded as 0.
+        http_first (bool): Try a plain HTTP fetch before the browser.
+        cache (ScrapeCache, optional): On-disk cache for the HTTP fetches, pages are then only requested when older
+            than the 'price' TTL (and revalidated with a conditional request). The cache counts are printed at the end.
+
+    Returns:
+        pd.DataFrame: Ingredient, url, price and source, the path that gave the price: 'http', 'browser',
+        'no url' or 'failed' (driver kept crashing).
+    """
+    items = list(urls.items()) if isinstance(urls, dict) else [list(x.items())[0] for x in urls]
+    delay = delay or AdaptiveDelay(target_concurrency=workers)
+    session = create_session(workers) if http_first else None
+    http = session
+    if session is not None and cache is not None:
+        # Cache hits do not wait for the politeness delay
+        http = cache.wrap(session, "price", throttle=lambda url: delay.wait())
+    work = queue.Queue()
+    for position, (key, url) in enumerate(items):
+        work.put((position, key, str(url), 1))
+
+    temp_journal = journal_path is None and save_path is None
+    if temp_journal:
+        fd, journal_path = tempfile.mkstemp(prefix="prices_", suffix=".partial.csv")
+        os.close(fd)
+    journal_path = journal_path or save_path + ".partial.csv"
+    journal_lock = threading.Lock()
+    results = {}
+    journal = open(journal_path, "w", newline="", encoding="utf-8")
+    writer = csv.writer(journal)
+    writer.writerow(["Ingredient", "url", "price", "source"])
+
+    def save(position, key, url, price, source):
+        with journal_lock:
+            results[position] = {"Ingredient": key, "url": url, "price": price, "source": source}
+            writer.writerow([key, url, price, source])
+            journal.flush()
+
+    def worker():
+        driver = None
+        while True:
+            try:
+                position, key, url, attempt = work.get_nowait()
+            except queue.Empty:
+                break
+            if not url or url == "nan":
+                save(position, key, url, 0, "no url")
+                continue
+            if http_first and attempt == 1:
+                if cache is None:
+                    delay.wait()
+                response = fetch_page(http, url, page_timeout)
+                price = parse_price(response.text) if response is not None else None
+                if price is not None:
+                    if not getattr(response, "from_cache", False):
+                        # Time to the response headers, without the politeness wait
+                        delay.record(response.elapsed.total_seconds())
+                    save(position, key, url, price, "http")
+                    continue
+            try:
+                if driver is None:
+                    driver = driver_factory()
+                delay.wait()
+                print(f"Trying URL:{url!r}")
+                start = time.monotonic()
+                try:
+                    price = fetch_price(driver, url, page_timeout)
+                    delay.record(time.monotonic() - start)
+                except TimeoutException:
+                    # Page loaded but is not a product page (or too slow): same result as get_price
+                    print(f"Error getting price for {url}: no product found")
+                    delay.record(time.monotonic() - start, ok=False)
+                    price = 0
+                save(position, key, url, price, "browser")
+            except Exception as e:
+                # The driver crashed (or could not start): replace it and try the URL again.
+                # Any error counts, an exception escaping here would end the worker and lose its URL
+                print(f"Driver failed on {url} (attempt {attempt}): {e}")
+                if driver is not None:
+                    try:
+                        driver.quit()
+                    except Exception:
+                        pass
+                    driver = None
+                if attempt < max_attempts:
+                    work.put((position, key, url, attempt + 1))
+                else:
+                    save(position, key, url, 0, "failed")
+        if driver is not None:
+            driver.quit()
+
+    try:
+        threads = [threading.Thread(target=worker, name=f"price-worker-{i}", daemon=True)
+                   for i in range(max(1, min(workers, len(items))))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        journal.close()
+        if session is not None:
+            session.close()
+
+    df = pd.DataFrame([results[position] for position in sorted(results)], columns=["Ingredient", "url", "price", "source"])
+    if cache is not None and session is not None:
+        df.attrs["cache"] = http.report()
+    if save_path is not None:
+        df.to_excel(save_path, index=False)
+        os.remove(journal_path)
+    elif temp_journal:
+        os.remove(journal_path)
+    return df
+
+
+# INCREMENTAL REFRESH
+# The price file keeps the current table (sheet PRICE_SHEET, the sheet scrape_all_prices writes) and every scraped
+# price with its time (sheet HISTORY_SHEET). A refresh only scrapes the ingredients whose price is missing, 0 (failed)
+# or older than max_age_days, or whose url changed, and appends the results to the history.
+PRICE_SHEET = "Sheet1"
+HISTORY_SHEET = "History"
+HISTORY_COLUMNS = ["Ingredient", "url", "price", "source", "ScrapedAt"]
+
+def price_value(prices):
+    # Numeric price, prices were saved with a decimal comma by earlier versions
+    return pd.to_numeric(prices.astype(str).str.replace(",", ".", regex=False), errors="coerce")
+
+def read_price_history(save_path):
+    """History of the price file (HISTORY_COLUMNS). A price file without a history (written by scrape_all_prices)
+    gives its table, dated with the modification time of the file (naive local time, like pd.Timestamp.now())."""
+    if not os.path.exists(save_path):
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    sheets = pd.read_excel(save_path, sheet_name=None, dtype={"price": str})
+    if HISTORY_SHEET in sheets:
+        history = sheets[HISTORY_SHEET]
+    else:
+        history = sheets[PRICE_SHEET] if PRICE_SHEET in sheets else next(iter(sheets.values()))
+        history = history.assign(source=None, ScrapedAt=pd.Timestamp.fromtimestamp(os.path.getmtime(save_path)))
+    history = history.reindex(columns=HISTORY_COLUMNS)
+    history["ScrapedAt"] = pd.to_datetime(history["ScrapedAt"])
+    return history
+
+def current_prices(history):
+    # Latest valid price per ingredient, the latest attempt when none is valid
+    history = history.assign(valid=price_value(history["price"]).fillna(0) > 0)
+    latest = history.sort_values("ScrapedAt", kind="stable").groupby("Ingredient", sort=False).tail(1)
+    latest_valid = history[history["valid"]].sort_values("ScrapedAt", kind="stable").groupby("Ingredient", sort=False).tail(1)
+    current = pd.concat([latest_valid, latest]).drop_duplicates("Ingredient")
+    # Keep the order in which ingredients first appear
+    order = pd.Index(history["Ingredient"].drop_duplicates())
+    current = current.set_index("Ingredient").reindex(order).reset_index()
+    return current[["Ingredient", "url", "price", "ScrapedAt"]]
+
+def stale_prices(items, current, max_age_days, now):
+    """(stale items, reasons): the (ingredient, url) items to scrape and how many are missing, zero, old or moved"""
+    known = current.assign(value=price_value(current["price"]).fillna(0)).set_index("Ingredient")
+    reasons = {"missing": 0, "zero": 0, "old": 0, "url changed": 0}
+    stale = []
+    for key, url in items:
+        if key not in known.index:
+            reason = "missing"
+        else:
+            row = known.loc[key]
+            if str(row["url"]) != str(url):
+                reason = "url changed"
+            elif not row["value"] > 0:
+                reason = "zero"
+            elif pd.isna(row["ScrapedAt"]) or now - row["ScrapedAt"] > pd.Timedelta(days=max_age_days):
+                reason = "old"
+            else:
+                continue
+        reasons[reason] += 1
+        stale.append((key, url))
+    return stale, reasons
+
+def write_price_file(save_path, current, history):
+    with pd.ExcelWriter(save_path) as writer:
+        current.to_excel(writer, sheet_name=PRICE_SHEET, index=False)
+        history.to_excel(writer, sheet_name=HISTORY_SHEET, index=False)
+
+def refresh_prices(urls, save_path, max_age_days=7, now=None, **scrape_kwargs):
+    """
+    Incremental scrape_all_prices: only scrapes the stale prices of save_path and merges them into its history.
+
+    Parameters:
+        urls: list of {ingredient: url} (as for scrape_all_prices), or a {ingredient: url} dict.
+        save_path (str): Price file, e.g. Excel_files/Log/Scraping_prices.xlsx. Sheet1 holds the current price per
+            ingredient (Ingredient, url, price, ScrapedAt), History every scraped price with its time.
+        max_age_days (float): Prices older than this are scraped again.
+        now (pd.Timestamp, optional): Time of the refresh, pd.Timestamp.now() by default.
+        scrape_kwargs: Passed to scrape_all_prices_parallel (workers, cache, ...).
+
+    Returns:
+        pd.DataFrame: The current price table (as saved in Sheet1).
+    """
+    now = now or pd.Timestamp.now()
+    items = list(urls.items()) if isinstance(urls, dict) else [list(x.items())[0] for x in urls]
+    history = read_price_history(save_path)
+
+    # Results of an interrupted refresh are still in its journal
+    journal_path = save_path + ".partial.csv"
+    if os.path.exists(journal_path):
+        recovered = pd.read_csv(journal_path, dtype={"price": str}, keep_default_na=False)
+        recovered["ScrapedAt"] = pd.Timestamp.fromtimestamp(os.path.getmtime(journal_path))
+        history = pd.concat([history, recovered.reindex(columns=HISTORY_COLUMNS)], ignore_index=True)
+        print(f"Recovered {len(recovered)} prices from an interrupted refresh")
+        # Saved before the journal is reused by this refresh
+        write_price_file(save_path, current_prices(history), history)
+        os.remove(journal_path)
+
+    stale, reasons = stale_prices(items, current_prices(history), max_age_days, now)
+    print(f"Refreshing {len(stale)} of {len(items)} prices ("
+          + ", ".join(f"{count} {reason}" for reason, count in reasons.items()) + ")")
+    if stale:
+        scraped = scrape_all_prices_parallel(dict(stale), None, journal_path=journal_path, **scrape_kwargs)
+        history = pd.concat([history, scraped.assign(ScrapedAt=now)[HISTORY_COLUMNS]], ignore_index=True)
+
+    current = current_prices(history)
+    write_price_file(save_path, current, history)
+    # The journal is only dropped once its prices are in the file
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+    current.attrs["refreshed"] = len(stale)
+    return current
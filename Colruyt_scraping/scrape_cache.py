@@ -0,0 +1,142 @@
+# On-disk HTTP cache for the Colruyt scrapers
+# Product pages are stored in SQLite (WAL mode), keyed by URL, with their ETag/Last-Modified and fetch time.
+# A page younger than the TTL of its kind is served from disk without a request. An older one is revalidated with a
+# conditional request (If-None-Match / If-Modified-Since): a 304 only refreshes the fetch time, a 200 replaces the body.
+# Nutrition values practically never change, prices change weekly, hence the two TTLs.
+
+import os
+import time
+import sqlite3
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+
+DEFAULT_CACHE_PATH = "./Excel_files/.cache/scrape_cache.sqlite"
+
+# Seconds a cached page is used without asking the server, per kind of data
+DEFAULT_TTL = {
+    "nutrition": 90 * 24 * 3600,
+    "price": 24 * 3600,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    body BLOB NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+class ScrapeCache:
+    """SQLite page cache shared by the scrapers (and their threads).
+    Use wrap(session, kind) to get a session whose get() goes through the cache.
+    Responses served from disk have from_cache = True."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=None):
+        self.path = path
+        self.ttl = {**DEFAULT_TTL, **(ttl or {})}
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def lookup(self, url):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT body, content_type, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+
+    def store(self, url, kind, response):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, kind, body, content_type, etag, last_modified, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, kind, response.content, response.headers.get("Content-Type"), response.headers.get("ETag"),
+                 response.headers.get("Last-Modified"), time.time()))
+
+    def touch(self, url, response):
+        # 304: the cached body is still valid, new validators may come with it
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE pages SET fetched_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+                "WHERE url = ?",
+                (time.time(), response.headers.get("ETag"), response.headers.get("Last-Modified"), url))
+
+    def wrap(self, session, kind, throttle=None):
+        return CachedSession(self, session, kind, throttle)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def cached_response(url, body, content_type):
+    # requests.Response rebuilt from the cache, so callers do not need to know where the page came from
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.from_cache = True
+    response.headers = CaseInsensitiveDict({"Content-Type": content_type} if content_type else {})
+    return response
+
+
+class CachedSession:
+    """session.get through a ScrapeCache, counting what each request cost for the run:
+    hits (served from disk), revalidated (304), misses (downloaded) and errors (non-200 answers, not cached).
+    throttle(url), e.g. a rate limiter, is called before each request that goes to the server (not for hits)."""
+
+    def __init__(self, cache, session, kind, throttle=None):
+        self.cache = cache
+        self.session = session
+        self.kind = kind
+        self.throttle = throttle
+        self.lock = threading.Lock()
+        self.counts = {"hits": 0, "revalidated": 0, "misses": 0, "errors": 0}
+
+    def count(self, counter):
+        with self.lock:
+            self.counts[counter] += 1
+
+    def get(self, url, headers=None, **kwargs):
+        row = self.cache.lookup(url)
+        if row is not None:
+            body, content_type, etag, last_modified, fetched_at = row
+            if time.time() - fetched_at < self.cache.ttl[self.kind]:
+                self.count("hits")
+                return cached_response(url, body, content_type)
+            headers = dict(headers or {})
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        if self.throttle is not None:
+            self.throttle(url)
+        response = self.session.get(url, headers=headers, **kwargs)
+        response.from_cache = False
+        if response.status_code == 304 and row is not None:
+            self.cache.touch(url, response)
+            self.count("revalidated")
+            return cached_response(url, body, content_type)
+        if response.status_code == 200:
+            self.cache.store(url, self.kind, response)
+            self.count("misses")
+        else:
+            self.count("errors")
+        return response
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def report(self):
+        stats = self.stats()
+        print(f"Scrape cache ({self.kind}): {stats['hits']} hits, {stats['revalidated']} revalidated, "
+              f"{stats['misses']} downloaded, {stats['errors']} errors")
+        return stats
@@ -0,0 +1,109 @@
+# Shared data cache for the Streamlit app
+# One SharedCache lives per server process (see get_shared_cache in streamlit_app.py), so every session and every rerun
+# reuses the same log frames instead of rebuilding them. Keys are explicit: a file signature (mtime/size) plus
+# whatever filter parameters the value depends on, so a changed file or filter simply becomes a new key.
+
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+def file_signature(*paths):
+    """(path, mtime_ns, size) for every existing path, SQLite -wal files are included because writes land there first"""
+    signature = []
+    for path in paths:
+        for candidate in (path, f"{path}-wal"):
+            try:
+                stat = os.stat(candidate)
+            except OSError:
+                continue
+            signature.append((candidate, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def estimate_size(value):
+    # Rough size in bytes, DataFrames by their column memory
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(index=True).sum()) if isinstance(value, pd.DataFrame) else int(value.memory_usage(index=True))
+    if isinstance(value, dict):
+        return sum(estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class SharedCache:
+    """Thread safe LRU cache with a time to live, an entry limit and a size limit.
+    Values are shared between sessions: callers must not modify what they get back."""
+
+    def __init__(self, max_entries=64, max_bytes=512 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.entries = OrderedDict()   # key => (created, size, value)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            created, _, value = entry
+            if time.monotonic() - created > self.ttl:
+                self.remove(key)
+                self.evictions += 1
+                return default
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (time.monotonic(), size, value)
+            self.total_bytes += size
+            # Evict least recently used entries, but always keep the newest one
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def remove(self, key):
+        with self.lock:
+            _, size, _ = self.entries.pop(key)
+            self.total_bytes -= size
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        with self.lock:
+            if value is not missing:
+                self.hits += 1
+                return value
+            self.misses += 1
+        # Compute outside the lock: another session may compute the same key meanwhile, last one wins
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "size_mb": self.total_bytes / 1024 / 1024,
+            }
@@ -0,0 +1,640 @@
+# Benchmarks for the data loading and analysis paths of the app
+# CMD run locally: python benchmarks.py            (all benchmarks)
+#                  python benchmarks.py snapshot   (only the benchmarks whose name contains 'snapshot')
+
+import io
+import contextlib
+import os
+import sys
+import time
+import tempfile
+import urllib.request
+import random
+import tracemalloc
+import threading
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+import pandas as pd
+import main
+import log_store
+from Colruyt_scraping import colruyt_scraper, colruyt_scraper_price, scrape_cache
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+
+DATA_FILE = "./Excel_files/data.xlsx"
+
+def timeit(fn, repeat=5):
+    # Best of n runs, in milliseconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def report(title, results):
+    print(f"\n{title}")
+    for label, ms in results:
+        print(f"  {label:<40} {ms:10.2f} ms")
+
+
+def bench_snapshot_load():
+    # Make sure a snapshot exists before timing the warm path
+    main.read_data_sheets(DATA_FILE)
+    results = [
+        ("cold Excel load", timeit(lambda: main.load_data_from_excel(DATA_FILE, use_snapshot=False))),
+        ("snapshot load", timeit(lambda: main.load_data_from_excel(DATA_FILE))),
+        ("read sheets from Excel", timeit(lambda: main.read_sheets_from_excel(DATA_FILE))),
+        ("read sheets from snapshot", timeit(lambda: main.read_data_sheets(DATA_FILE))),
+    ]
+    report("data.xlsx: Excel vs snapshot", results)
+
+
+def make_catalogue(n_ingredients, n_recipe_lines, ingredients_per_recipe=10):
+    # Synthetic Ingredients/Recipes sheets with the same columns as data.xlsx
+    df_ingredients = pd.DataFrame({
+        "name": [f"Ingredient {i}" for i in range(n_ingredients)],
+        "gramPerUnit": [(i % 250) + 1 for i in range(n_ingredients)],
+        "url": [f"https://example.com/{i}" for i in range(n_ingredients)],
+        "kcal_100g": [float(i % 900) for i in range(n_ingredients)],
+        "prot_100g": [float(i % 40) for i in range(n_ingredients)],
+        "priceurl": [f"https://example.com/price/{i}" for i in range(n_ingredients)],
+    })
+    df_recipes = pd.DataFrame({
+        "recipe_name": [f"Recipe {i // ingredients_per_recipe}" for i in range(n_recipe_lines)],
+        "ingredient": [f"Ingredient {(i * 7) % n_ingredients}" for i in range(n_recipe_lines)],
+        "amount": [float(i % 300) + 1 for i in range(n_recipe_lines)],
+        "unit": ["g" if i % 3 else "u" for i in range(n_recipe_lines)],
+    })
+    return df_ingredients, df_recipes
+
+def load_with_iterrows(df_ingredients, df_recipes):
+    # Previous loader: one constructor call per iterrows() row
+    main.IngredientDict.clear()
+    for _, row in df_ingredients.iterrows():
+        main.Ingredient(row['name'], row['gramPerUnit'], row.get('url', ''), row.get('kcal_100g', ''),
+                        row.get('prot_100g', ''), row.get('priceurl', ''))
+    main.RecipeDict.clear()
+    for recipe_name, group in df_recipes.groupby('recipe_name'):
+        ingredientsRecipe = {}
+        for _, row in group.iterrows():
+            ingredientsRecipe[row['ingredient']] = {'amount': row['amount'], 'unit': row['unit']}
+        main.Recipe(recipe_name, ingredientsRecipe)
+
+def load_bulk(df_ingredients, df_recipes):
+    main.load_ingredients_from_df(df_ingredients)
+    main.load_recipes_from_df(df_recipes)
+
+def bench_loaders():
+    results = []
+    for n in [1_000, 10_000, 100_000]:
+        df_ingredients, df_recipes = make_catalogue(n, n)
+        repeat = 3 if n < 100_000 else 1
+        results.append((f"iterrows loader ({n:,} rows)", timeit(lambda: load_with_iterrows(df_ingredients, df_recipes), repeat)))
+        results.append((f"bulk loader ({n:,} rows)", timeit(lambda: load_bulk(df_ingredients, df_recipes), repeat)))
+    report("Ingredient/recipe loaders on synthetic catalogues", results)
+    # Restore the real data for the benchmarks that follow
+    main.load_data_from_excel(DATA_FILE)
+
+
+class LegacyIngredient:
+    # Previous model: one object with a __dict__ per ingredient, derived values stored as floats
+    def __init__(self, name, gramPerUnit, url, kcal_100g, prot_100g, priceurl):
+        self.name = name
+        self.gramPerUnit = gramPerUnit
+        self.url = url
+        self.kcal_100g = float(kcal_100g)
+        self.prot_100g = float(prot_100g)
+        self.priceurl = priceurl
+        self.kcal_unit = (gramPerUnit * (self.kcal_100g/100)) if self.kcal_100g>0 else 0
+        self.prot_unit = (gramPerUnit * (self.prot_100g/100)) if self.prot_100g>0 else 0
+        self.protPer100Kcal = (self.prot_100g / self.kcal_100g*100) if self.kcal_100g>0 else 0
+
+def build_legacy_dict(df_ingredients):
+    return {main.makeKey(row.name): LegacyIngredient(row.name, row.gramPerUnit, row.url, row.kcal_100g, row.prot_100g, row.priceurl)
+            for row in df_ingredients.itertuples(index=False)}
+
+def build_table(df_ingredients):
+    main.load_ingredients_from_df(df_ingredients)
+    return main.IngredientDict
+
+def measure_memory(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 1024 / 1024
+
+def bench_ingredient_table():
+    n = 100_000
+    df_ingredients, _ = make_catalogue(n, 0)
+    # Only measure what the model itself holds, the strings are shared by both
+    df_ingredients = df_ingredients.astype({"name": object, "url": object, "priceurl": object})
+    legacy, legacy_mb = measure_memory(lambda: build_legacy_dict(df_ingredients))
+    table, table_mb = measure_memory(lambda: build_table(df_ingredients))
+
+    keys = random.Random(0).choices(list(legacy), k=100_000)
+    def lookup(ingredients):
+        total = 0
+        for key in keys:
+            total += ingredients[key].kcal_100g
+        return total
+    def lookup_derived(ingredients):
+        total = 0
+        for key in keys:
+            total += ingredients[key].kcal_unit
+        return total
+    def helper_legacy():
+        # What getIngrKcalPerUnit did on the dict of objects
+        total = 0
+        for key in keys:
+            total += float(legacy[main.makeKey(key)].kcal_unit)
+        return total
+    def helper_table():
+        total = 0
+        for key in keys:
+            total += main.getIngrKcalPerUnit(key)
+        return total
+
+    print(f"\nIngredient model memory ({n:,} ingredients)")
+    print(f"  {'dict of Ingredient objects':<40} {legacy_mb:10.2f} MB")
+    print(f"  {'IngredientTable':<40} {table_mb:10.2f} MB")
+    report("Ingredient lookups (100,000 random keys)", [
+        ("dict of objects: .kcal_100g", timeit(lambda: lookup(legacy), 3)),
+        ("IngredientTable: .kcal_100g", timeit(lambda: lookup(table), 3)),
+        ("dict of objects: .kcal_unit", timeit(lambda: lookup_derived(legacy), 3)),
+        ("IngredientTable: .kcal_unit", timeit(lambda: lookup_derived(table), 3)),
+        ("IngredientTable: column('kcal_unit')[rows]", timeit(lambda: table.column('kcal_unit')[table.rows(keys)].sum(), 3)),
+        ("dict of objects: getIngrKcalPerUnit", timeit(helper_legacy, 3)),
+        ("IngredientTable: getIngrKcalPerUnit", timeit(helper_table, 3)),
+    ])
+    main.load_data_from_excel(DATA_FILE)
+
+
+def make_recipe_rows(n_rows):
+    # Rows shaped like Recipe.toDataFrameRows, drawn from the real recipes
+    rows = [row for recipe in main.RecipeDict.values() for row in recipe.toDataFrameRows(1)]
+    return pd.DataFrame([rows[i % len(rows)] for i in range(n_rows)])
+
+def bench_compute_nutrition():
+    df = make_recipe_rows(100_000)
+    def per_row():
+        return [(main.getIngrKcal(key, amount, unit), main.getIngrProt(key, amount, unit))
+                for key, amount, unit in zip(df["IngredientKey"], df["Amount"], df["Unit"])]
+    report("Nutrition for 100,000 (ingredient, amount, unit) rows", [
+        ("getIngrKcal/getIngrProt per row", timeit(per_row, 3)),
+        ("compute_nutrition", timeit(lambda: main.compute_nutrition(df), 3)),
+    ])
+
+
+def make_log(n_rows):
+    # Log Combined shaped rows (Ingredient label, Amount, Unit)
+    labels = [ingredient.getLabel() for ingredient in main.IngredientDict.values()]
+    return pd.DataFrame({
+        "Ingredient": [labels[i % len(labels)] for i in range(n_rows)],
+        "Amount": [float(i % 500) + 1 for i in range(n_rows)],
+        "Unit": ["g" if i % 2 else "u" for i in range(n_rows)],
+    })
+
+def convert_to_units_apply(df):
+    # Previous implementation: one getIngrGramPerUnit call per gram row
+    df = df.copy()
+    df_all_g = df["Unit"] == "g"
+    df.loc[df_all_g, "Amount"] = df.loc[df_all_g].apply(
+        lambda row: row["Amount"] / main.getIngrGramPerUnit(row["Ingredient"]), axis=1)
+    df["Unit"] = "u"
+    return df
+
+def bench_convert_to_units():
+    df = make_log(1_000_000)
+    report("convert_to_units on a 1,000,000 row log", [
+        ("row-wise apply (g -> u)", timeit(lambda: convert_to_units_apply(df), 1)),
+        ("vectorized mode='u'", timeit(lambda: main.convert_to_units(df), 3)),
+        ("vectorized mode='g'", timeit(lambda: main.convert_to_units(df, mode="g"), 3)),
+        ("vectorized mode='mixed'", timeit(lambda: main.convert_to_units(df, mode="mixed"), 3)),
+    ])
+
+
+def categorize_with_loops(ingredient):
+    # Previous implementation: substring scan per keyword, per category
+    ingredient_upper = ingredient.upper()
+    for category, keywords in main.category_keywords.items():
+        if any(keyword in ingredient_upper for keyword in keywords):
+            return category
+    return "Other"
+
+def bench_categorize():
+    series = make_log(1_000_000)["Ingredient"]
+    names = [f"{label} extra {i}" for i, label in enumerate(series.iloc[:20_000])]
+    def classifier_cold():
+        main.rebuild_classifiers()
+        return [main.categorize_ingredient(name) for name in names]
+    report("Ingredient categories", [
+        ("keyword loops, 20,000 unique names", timeit(lambda: [categorize_with_loops(name) for name in names], 3)),
+        ("classifier, 20,000 unique names (cold)", timeit(classifier_cold, 3)),
+        (".apply(loops), 1,000,000 log rows", timeit(lambda: series.apply(categorize_with_loops), 1)),
+        ("categorize_series, 1,000,000 log rows", timeit(lambda: main.categorize_series(series), 3)),
+    ])
+
+
+def make_recipes(n_recipes, ingredients_per_recipe=10):
+    # Synthetic recipes drawn from the real ingredients, so part of them is in season
+    keys = list(main.IngredientDict.keys())
+    labels = [main.IngredientDict[key].getLabel() for key in keys]
+    rng = random.Random(0)
+    recipes = {}
+    for i in range(n_recipes):
+        chosen = rng.sample(labels, k=min(ingredients_per_recipe, len(labels)))
+        recipes[f"RECIPE{i}"] = main.Recipe.__new__(main.Recipe)
+        recipes[f"RECIPE{i}"].name = f"Recipe {i}"
+        recipes[f"RECIPE{i}"].ingredientsRecipe = {label: {'amount': float(rng.randint(1, 300)), 'unit': rng.choice("gu")} for label in chosen}
+    return recipes
+
+def season_scores_with_loops(month):
+    # Straightforward version: per recipe, per ingredient, for one month
+    seasonal = set(main.seasonal_ingredients[str(month)])
+    scores = []
+    for key, recipe in main.RecipeDict.items():
+        total = in_season = 0
+        for ingredient, values in recipe.ingredientsRecipe.items():
+            ingredient_key = main.makeKey(ingredient)
+            grams = values['amount'] if values['unit'] == "g" else values['amount'] * main.IngredientDict[ingredient_key].gramPerUnit
+            total += grams
+            in_season += grams if ingredient_key in seasonal else 0
+        scores.append((key, in_season / total if total else 0.0))
+    return sorted(scores, key=lambda item: -item[1])[:5]
+
+def bench_season_ranking():
+    results = []
+    for n in [1_000, 50_000]:
+        main.RecipeDict.clear()
+        main.RecipeDict.update(make_recipes(n))
+        main.invalidate_recipe_indexes()
+        results.append((f"per recipe loops, 1 month ({n:,} recipes)", timeit(lambda: season_scores_with_loops(8), 3)))
+        results.append((f"build, 12 months ({n:,} recipes)", timeit(lambda: main.RecipeSeasons.build(), 3)))
+        results.append((f"recipe_season_top_k ({n:,} recipes)", timeit(lambda: main.recipe_season_top_k(8, 5), 100)))
+    report("In season ranking", results)
+    main.load_data_from_excel(DATA_FILE)
+
+
+def extra_row_options_previous(ingredient_options, last_extra_map, selected_last_extras, row_choices):
+    # Previous Grocery List Maker loop: a full scan of the catalogue per row, and per label a rebuilt list of reused extras
+    used_ingredients = []
+    for current_ingr in row_choices:
+        available_ingredients = sorted([
+            label for label in ingredient_options
+            if (label not in used_ingredients and
+                label not in [row['Ingredient'] for label, row in last_extra_map.items() if label in selected_last_extras])
+            or label == current_ingr])
+        ingr_display = {ing: ing for ing in available_ingredients}
+        select_options = ["Select an ingredient..."] + list(ingr_display.keys())
+        select_options.index(current_ingr)
+        used_ingredients.append(current_ingr)
+
+def extra_row_options_sets(ingredient_options, sorted_labels, last_extra_ingredients, row_choices):
+    # Current loop: set exclusions, filtered pre-sorted labels
+    used_ingredients = set()
+    reused_ingredients = set(last_extra_ingredients.values())
+    for current_ingr in row_choices:
+        if used_ingredients or reused_ingredients:
+            available_ingredients = [label for label in sorted_labels
+                                     if (label not in used_ingredients and label not in reused_ingredients) or label == current_ingr]
+        else:
+            available_ingredients = sorted_labels
+        select_options = ["Select an ingredient..."] + available_ingredients
+        select_options.index(current_ingr if current_ingr in ingredient_options else "Select an ingredient...")
+        used_ingredients.add(current_ingr)
+
+def bench_extra_rows():
+    n_ingredients, n_rows, n_extras = 20_000, 50, 20
+    labels = [f"Ingredient {i}" for i in range(n_ingredients)]
+    ingredient_options = {label: (label.replace(" ", "").upper(), None) for label in labels}
+    sorted_labels = sorted(ingredient_options)
+    last_extra_map = {f"{labels[i]} (1 u)": {"Ingredient": labels[i], "Amount": 1, "Unit": "u"} for i in range(n_extras)}
+    selected_last_extras = list(last_extra_map)
+    last_extra_ingredients = {label: row["Ingredient"] for label, row in last_extra_map.items()}
+    row_choices = labels[n_extras:n_extras + n_rows]
+    report(f"Extra ingredient rows: {n_rows} rows, {n_ingredients:,} ingredients, {n_extras} reused extras", [
+        ("list scans (previous)", timeit(lambda: extra_row_options_previous(ingredient_options, last_extra_map, selected_last_extras, row_choices), 1)),
+        ("set exclusions + sorted labels", timeit(lambda: extra_row_options_sets(ingredient_options, sorted_labels, last_extra_ingredients, row_choices), 3)),
+    ])
+
+
+def grocery_list_with_frames(selection, extras):
+    # Previous maker: one DataFrame per recipe, concat, groupby, and the same frames again for the Per Recipe tab
+    frames = []
+    for recipe, portion in selection.items():
+        df = pd.DataFrame(main.RecipeDict[recipe].toDataFrameRows(portion)).copy()
+        df.insert(0, 'Recipe', recipe.ljust(12))
+        df.insert(1, 'Portion', portion)
+        df['Notes'] = ""
+        frames.append(df)
+    all_data = pd.concat(frames, ignore_index=True)
+    all_data["Unit"] = all_data["Unit"].str.strip().str.lower()
+    all_data = pd.concat([all_data, pd.DataFrame(extras)], ignore_index=True)
+    combined = all_data.groupby(["Ingredient", "Unit"], as_index=False).sum()[["Ingredient", "Amount", "Unit"]]
+    per_recipe = [pd.DataFrame(main.RecipeDict[recipe].toDataFrameRows(portion)) for recipe, portion in selection.items()]
+    return combined, per_recipe
+
+def bench_aggregate():
+    main.RecipeDict.update(make_recipes(20_000))
+    main.invalidate_recipe_indexes()
+    labels = [ingredient.getLabel() for ingredient in main.IngredientDict.values()]
+    extras = [{"Ingredient": label, "IngredientKey": main.makeKey(label), "Unit": "u", "Amount": 1} for label in labels[:10]]
+    results = [("build matrix (20,018 recipes)", timeit(main.RecipeMatrix.build, 3))]
+    for n in [10, 200]:
+        selection = {f"RECIPE{i}": (i % 4) + 1 for i in range(n)}
+        results.append((f"DataFrame per recipe ({n} recipes)", timeit(lambda: grocery_list_with_frames(selection, extras), 3)))
+        results.append((f"aggregate_grocery_list ({n} recipes)", timeit(lambda: main.aggregate_grocery_list(selection, extras), 3)))
+    report("Grocery list aggregation", results)
+    main.load_data_from_excel(DATA_FILE)
+
+
+def make_log_store(path, n_rows):
+    # Synthetic log store with n_rows per sheet
+    if os.path.exists(path):
+        os.remove(path)
+    combined = make_log(n_rows).assign(ExportDate=[f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}" for i in range(n_rows)])
+    per_recipe = combined.assign(Recipe="Recipe 1", Portion=2, IngredientKey=combined["Ingredient"].str.upper(), Notes="")
+    conn = log_store.connect(path)
+    with conn:
+        log_store.insert_rows(conn, "Log Per Recipe", per_recipe)
+        log_store.insert_rows(conn, "Log Combined", combined)
+    conn.close()
+
+def export_log_with_excelwriter(db_path, target):
+    # Previous export_log_to_excel: full DataFrames and a full openpyxl workbook in memory
+    with pd.ExcelWriter(target, engine="openpyxl") as writer:
+        for sheet_name in log_store.LOG_TABLES:
+            log_store.read_log(db_path, sheet_name).to_excel(writer, index=False, sheet_name=sheet_name)
+
+def peak_memory(fn):
+    # Peak traced memory in MB (tracemalloc slows openpyxl down a lot, time is measured separately)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+def bench_xlsx_writer():
+    db_path = os.path.join(tempfile.gettempdir(), "bench_log.sqlite")
+    print("\nLog export to xlsx (time, peak traced memory)")
+    for n in [5_000, 25_000]:
+        make_log_store(db_path, n)
+        for label, fn in [("pd.ExcelWriter", lambda: export_log_with_excelwriter(db_path, io.BytesIO())),
+                          ("streaming write_only", lambda: log_store.export_log_to_excel(db_path, io.BytesIO()))]:
+            ms, mb = timeit(fn, 1), peak_memory(fn)
+            print(f"  {label + f' ({n:,} rows/sheet)':<40} {ms:10.2f} ms {mb:10.2f} MB")
+    os.remove(db_path)
+
+
+def bench_log_reader():
+    db_path = os.path.join(tempfile.gettempdir(), "bench_log.sqlite")
+    n = 500_000
+    make_log_store(db_path, n)
+    full = log_store.read_log(db_path, "Log Combined")
+    pinned = log_store.read_log_frame(db_path, "Log Combined")
+    print(f"\nLog Combined frame memory ({n:,} rows)")
+    print(f"  {'read_log (object columns)':<40} {full.memory_usage(deep=True).sum() / 1024 / 1024:10.2f} MB")
+    print(f"  {'read_log_frame (pinned dtypes)':<40} {pinned.memory_usage(deep=True).sum() / 1024 / 1024:10.2f} MB")
+    report(f"Reading Log Combined ({n:,} rows)", [
+        ("read_log", timeit(lambda: log_store.read_log(db_path, "Log Combined"), 3)),
+        ("read_log_frame", timeit(lambda: log_store.read_log_frame(db_path, "Log Combined"), 3)),
+        ("read_log_frame, 1 month", timeit(lambda: log_store.read_log_frame(db_path, "Log Combined", start="2024-03-01", end="2024-03-31"), 3)),
+    ])
+    os.remove(db_path)
+
+# Local stand-in for the Colruyt product pages: a saved product page (Colruyt_scraping/fixtures),
+# served with a fixed latency per request so that connection reuse and concurrency show up in the timings
+with open(os.path.join(os.path.dirname(colruyt_scraper.__file__), "fixtures", "product_nutrition.html"), "rb") as f:
+    PRODUCT_PAGE = f.read()
+
+class StubProductHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like the real site
+    disable_nagle_algorithm = True  # headers and body are written separately
+    latency = 0.05
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        etag = '"product-v1"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = PRODUCT_PAGE
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_stub_server(handler=StubProductHandler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def bench_nutrition_scraper():
+    server = start_stub_server()
+    base = f"http://127.0.0.1:{server.server_port}"
+    n = 40
+    urls = {f"ingredient {i}": f"{base}/product/{i}" for i in range(n)}
+    batch = colruyt_scraper.scrape_nutrition_batch(urls, rate_per_host=0)
+    assert (batch["status"] == "ok").all() and (batch["kcal_100g"] == 352).all()
+    report(f"Scraping nutrition of {n} product pages (stub server, {StubProductHandler.latency * 1000:.0f} ms latency)", [
+        ("get_nutritional_data one by one", timeit(lambda: [colruyt_scraper.get_nutritional_data(url) for url in urls.values()], 1)),
+        ("scrape_nutrition_batch, 1 worker", timeit(lambda: colruyt_scraper.scrape_nutrition_batch(urls, max_workers=1, rate_per_host=0), 1)),
+        ("scrape_nutrition_batch, 8 workers", timeit(lambda: colruyt_scraper.scrape_nutrition_batch(urls, rate_per_host=0), 1)),
+        ("8 workers, 4 requests/s per host", timeit(lambda: colruyt_scraper.scrape_nutrition_batch(dict(list(urls.items())[:8])), 1)),
+    ])
+    server.shutdown()
+
+
+# Static-file stand-in for the price pages: product pages written to a temp folder and served by a plain
+# file server with a page load latency. StaticPageDriver loads them like a browser would (get, page_source,
+# find_element), so the price pipeline can be timed without Chrome.
+PRICE_PAGE = """<html><body><div class="product-detail__info">
+<span class="product__price__final-price">€\xa0{price}</span>
+<span class="product__price__kilo-price">€\xa0{kilo}</span>
+</div></body></html>"""
+
+class SlowStaticHandler(SimpleHTTPRequestHandler):
+    latency = 0.2
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+JS_SHELL_PAGE = """<html><body><div id="app"></div><script src="/bundle.js"></script></body></html>"""
+
+def start_static_server(n_pages, js_every=0):
+    # product_i.html is what a plain HTTP fetch gets: every js_every-th page is an empty JS shell.
+    # product_i.html.rendered is the page after the browser ran the JS (see StaticPageDriver).
+    folder = tempfile.mkdtemp(prefix="bench_pages_")
+    for i in range(n_pages):
+        page = PRICE_PAGE.format(price=f"{i % 9 + 1},49", kilo=f"{i % 7 + 2},10")
+        with open(os.path.join(folder, f"product_{i}.html"), "w", encoding="utf-8") as f:
+            f.write(JS_SHELL_PAGE if js_every and i % js_every == 0 else page)
+        with open(os.path.join(folder, f"product_{i}.html.rendered"), "w", encoding="utf-8") as f:
+            f.write(page)
+    return start_stub_server(partial(SlowStaticHandler, directory=folder))
+
+class StaticPageDriver:
+    """Minimal stand-in for a Chrome driver; crash_every > 0 makes every nth page load fail like a crashed browser.
+    render_overhead (s) is added to each page load for starting the page and running its JS."""
+    def __init__(self, crash_every=0, render_overhead=0.0):
+        self.crash_every = crash_every
+        self.render_overhead = render_overhead
+        self.loads = 0
+        self.page_source = ""
+
+    def get(self, url):
+        self.loads += 1
+        if self.crash_every and self.loads % self.crash_every == 0:
+            raise WebDriverException("chrome not reachable")
+        time.sleep(self.render_overhead)
+        with urllib.request.urlopen(url + ".rendered") as response:
+            self.page_source = response.read().decode()
+
+    def find_element(self, by, value):
+        if f'class="{value}"' not in self.page_source:
+            raise NoSuchElementException(value)
+        return value
+
+    def quit(self):
+        pass
+
+def scrape_prices_serially(urls, render_overhead=0.0):
+    # scrape_all_prices loop, with the stand-in driver
+    driver = StaticPageDriver(render_overhead=render_overhead)
+    data = []
+    for x in urls:
+        key, url = list(x.items())[0]
+        data.append({"Ingredient": key, "url": url, "price": colruyt_scraper_price.get_price(driver, url)})
+        time.sleep(1)
+    return pd.DataFrame(data)
+
+def bench_price_pipeline():
+    # Page loads of about 1.2 s, like Chrome on the real site (0.2 s server latency + 1 s rendering)
+    n = 16
+    render = 1.0
+    server = start_static_server(n)
+    base = f"http://127.0.0.1:{server.server_port}"
+    urls = [{f"ingredient {i}": f"{base}/product_{i}.html"} for i in range(n)]
+    target = os.path.join(tempfile.gettempdir(), "bench_prices.xlsx")
+    parallel = lambda workers, crash_every=0: colruyt_scraper_price.scrape_all_prices_parallel(
+        urls, target, workers=workers, http_first=False,
+        driver_factory=lambda: StaticPageDriver(crash_every, render_overhead=render))
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = scrape_prices_serially(urls[:4])
+        assert parallel(4)[:4][expected.columns].equals(expected)
+        assert parallel(4, crash_every=5)["price"].tolist() == parallel(4)["price"].tolist()
+        results = [
+            (f"serial, 1 s pause ({n} pages)", timeit(lambda: scrape_prices_serially(urls, render), 1)),
+            ("parallel, 1 driver", timeit(lambda: parallel(1), 1)),
+            ("parallel, 2 drivers", timeit(lambda: parallel(2), 1)),
+            ("parallel, 4 drivers", timeit(lambda: parallel(4), 1)),
+            ("parallel, 4 drivers, crash every 5", timeit(lambda: parallel(4, crash_every=5), 1)),
+        ]
+    report(f"Price scraping of {n} product pages (page load {SlowStaticHandler.latency + render:.1f} s)", results)
+    server.shutdown()
+    os.remove(target)
+
+
+def bench_price_http_first():
+    n = 24
+    server = start_static_server(n, js_every=4)
+    base = f"http://127.0.0.1:{server.server_port}"
+    urls = [{f"ingredient {i}": f"{base}/product_{i}.html"} for i in range(n)]
+    target = os.path.join(tempfile.gettempdir(), "bench_prices.xlsx")
+    run = lambda http_first: colruyt_scraper_price.scrape_all_prices_parallel(
+        urls, target, workers=4, driver_factory=lambda: StaticPageDriver(render_overhead=1.0), http_first=http_first,
+        delay=colruyt_scraper_price.AdaptiveDelay(min_delay=0.02, target_concurrency=4))
+    with contextlib.redirect_stdout(io.StringIO()):
+        browser, http = run(False), run(True)
+        assert browser["price"].equals(http["price"])
+        results = [("browser only", timeit(lambda: run(False), 1)),
+                   ("HTTP first, browser as fallback", timeit(lambda: run(True), 1))]
+    report(f"Price scraping of {n} pages, 1 in 4 rendered by JS (1 s browser overhead per page)", results)
+    print("  paths: " + ", ".join(f"{source} {count}" for source, count in http["source"].value_counts().items()))
+    server.shutdown()
+    os.remove(target)
+
+
+def bench_scrape_cache():
+    server = start_stub_server()
+    base = f"http://127.0.0.1:{server.server_port}"
+    n = 40
+    urls = {f"ingredient {i}": f"{base}/product/{i}" for i in range(n)}
+    cache_path = os.path.join(tempfile.gettempdir(), "bench_scrape_cache.sqlite")
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(cache_path + suffix):
+            os.remove(cache_path + suffix)
+    fresh = scrape_cache.ScrapeCache(cache_path)
+    expired = scrape_cache.ScrapeCache(cache_path, ttl={"nutrition": 0})
+    scrape = lambda cache: colruyt_scraper.scrape_nutrition_batch(urls, rate_per_host=10, cache=cache)
+    results, counts = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for label, cache in [("no cache", None), ("cold cache (downloads)", fresh),
+                             ("expired TTL (304 revalidation)", expired), ("within TTL (served from disk)", fresh)]:
+            start = time.perf_counter()
+            df = scrape(cache)
+            results.append((label, (time.perf_counter() - start) * 1000))
+            assert (df["kcal_100g"] == 352).all()
+            counts.append(f"{label}: {df.attrs.get('cache')}")
+    report(f"Scraping nutrition of {n} pages, 10 requests/s per host", results)
+    for line in counts[1:]:
+        print("  " + line)
+    fresh.close()
+    expired.close()
+    server.shutdown()
+
+
+def bench_price_refresh():
+    n = 60
+    server = start_static_server(n)
+    base = f"http://127.0.0.1:{server.server_port}"
+    urls = [{f"ingredient {i}": f"{base}/product_{i}.html"} for i in range(n)]
+    target = os.path.join(tempfile.gettempdir(), "bench_price_refresh.xlsx")
+    kwargs = dict(workers=4, driver_factory=StaticPageDriver, http_first=True)
+    eager = lambda: colruyt_scraper_price.AdaptiveDelay(min_delay=0.02, target_concurrency=4)
+    # Last week's file: 1 in 10 prices failed (0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        last_week = colruyt_scraper_price.scrape_all_prices_parallel(urls, target, delay=eager(), **kwargs)
+    last_week.loc[::10, "price"] = "0"
+    last_week[["Ingredient", "url", "price"]].to_excel(target, index=False)
+    now = pd.Timestamp(os.path.getmtime(target), unit="s") + pd.Timedelta(days=3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [
+            (f"full scrape ({n} prices)", timeit(lambda: colruyt_scraper_price.scrape_all_prices_parallel(
+                urls, target + ".full.xlsx", delay=eager(), **kwargs), 1)),
+        ]
+        start = time.perf_counter()
+        current = colruyt_scraper_price.refresh_prices(urls, target, max_age_days=7, now=now, delay=eager(), **kwargs)
+        results.append((f"refresh ({current.attrs['refreshed']} stale prices)", (time.perf_counter() - start) * 1000))
+    assert (colruyt_scraper_price.price_value(current["price"]) > 0).all()
+    report("Weekly price refresh", results)
+    server.shutdown()
+    for path in [target, target + ".full.xlsx"]:
+        os.remove(path)
+
+
+BENCHMARKS = [bench_snapshot_load, bench_loaders, bench_ingredient_table, bench_compute_nutrition,
+              bench_convert_to_units, bench_categorize, bench_season_ranking,
+              bench_extra_rows, bench_aggregate, bench_xlsx_writer,
+              bench_log_reader, bench_nutrition_scraper, bench_price_pipeline,
+              bench_price_http_first, bench_scrape_cache, bench_price_refresh]
+
+if __name__ == "__main__":
+    selection = sys.argv[1:]
+    for bench in BENCHMARKS:
+        if not selection or any(name in bench.__name__ for name in selection):
+            bench()
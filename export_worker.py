@@ -0,0 +1,126 @@
+# Background writer for the grocery list export
+# The maker page used to write the Excel export and the log inside the Streamlit script, on every rerun.
+# Now it only submits a job: one ExportWorker thread per server process (see get_export_worker in streamlit_app.py)
+# runs it once the list has stopped changing for `debounce` seconds. Jobs are keyed (one key per day), a new job
+# for a key that is still waiting replaces the old one, so a burst of reruns ends in a single write.
+# Jobs can carry a content hash (see content_hash): a job with the same content as the last save (or as the job that
+# is already queued) is skipped, so reruns that do not change the list do not write anything.
+# The thread is a daemon, so the worker flushes what is still waiting out its debounce window when the process exits.
+
+import time
+import atexit
+import hashlib
+import threading
+import traceback
+import pandas as pd
+
+def content_hash(*frames):
+    """Stable sha256 of DataFrames: columns, dtypes and values (not the index), equal across processes"""
+    digest = hashlib.sha256()
+    for df in frames:
+        digest.update(repr((list(df.columns), [str(dtype) for dtype in df.dtypes], len(df))).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+class ExportWorker:
+    """Debouncing background worker with a bounded number of pending jobs.
+    Jobs are callables without arguments, their status can be read with status(key)."""
+
+    def __init__(self, debounce=2.0, max_pending=8, exit_timeout=30.0):
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self.lock = threading.Condition()
+        self.pending = {}       # key => (due, job, content hash)
+        self.statuses = {}      # key => status dict, see status()
+        self.thread = threading.Thread(target=self.run, name="export-worker", daemon=True)
+        self.thread.start()
+        # Pending jobs are written on interpreter exit instead of being lost with the daemon thread
+        atexit.register(self.flush, exit_timeout)
+
+    def submit(self, key, job, content_hash=None):
+        """Queue job for key, replacing a job for the same key that did not run yet.
+        With a content_hash, the job is skipped when that content is already saved or queued.
+        Returns False when max_pending other keys are already waiting (the job is dropped)."""
+        with self.lock:
+            status = self.statuses.setdefault(key, {
+                "state": "idle", "submitted": 0, "coalesced": 0, "skipped": 0, "writes": 0,
+                "last_submit": None, "last_write": None, "error": None,
+                "saved_hash": None, "target_hash": None})
+            if content_hash is not None and content_hash == status["target_hash"]:
+                status["skipped"] += 1
+                return True
+            if key in self.pending:
+                status["coalesced"] += 1
+            elif len(self.pending) >= self.max_pending:
+                return False
+            self.pending[key] = (time.monotonic() + self.debounce, job, content_hash)
+            # What the file will hold once everything queued for key has run
+            status["target_hash"] = content_hash
+            status["submitted"] += 1
+            status["state"] = "pending"
+            status["last_submit"] = time.time()
+            self.lock.notify_all()
+            return True
+
+    def status(self, key):
+        """Copy of {'state': idle/pending/running/done/failed, 'submitted', 'coalesced', 'skipped', 'writes',
+        'last_submit', 'last_write' (epoch seconds), 'error', 'saved_hash', 'target_hash'} for key,
+        or None if nothing was submitted"""
+        with self.lock:
+            status = self.statuses.get(key)
+            return dict(status) if status else None
+
+    def stats(self):
+        """Totals over all keys: writes performed, submits skipped as unchanged, submits coalesced"""
+        with self.lock:
+            return {counter: sum(status[counter] for status in self.statuses.values())
+                    for counter in ("writes", "skipped", "coalesced")}
+
+    def flush(self, timeout=None):
+        """Run everything that is pending now and wait until it is written (e.g. before shutting down)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            self.pending = {key: (0, job, job_hash) for key, (_, job, job_hash) in self.pending.items()}
+            self.lock.notify_all()
+            while self.pending or any(status["state"] == "running" for status in self.statuses.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.lock.wait(remaining)
+        return True
+
+    def run(self):
+        while True:
+            with self.lock:
+                while True:
+                    now = time.monotonic()
+                    due = [key for key, (due_at, _, _) in self.pending.items() if due_at <= now]
+                    if due:
+                        break
+                    next_due = min((due_at for due_at, _, _ in self.pending.values()), default=None)
+                    self.lock.wait(None if next_due is None else next_due - now)
+                key = due[0]
+                _, job, job_hash = self.pending.pop(key)
+                self.statuses[key]["state"] = "running"
+
+            # The job runs outside the lock, new submits for the key are queued meanwhile
+            try:
+                job()
+                error = None
+            except Exception:
+                error = traceback.format_exc()
+                print(f"Export {key} failed:\n{error}")
+
+            with self.lock:
+                status = self.statuses[key]
+                status["error"] = error
+                if error is None:
+                    status["writes"] += 1
+                    status["last_write"] = time.time()
+                    status["saved_hash"] = job_hash
+                elif key not in self.pending:
+                    # Nothing newer is queued: the next submit of this content has to write again
+                    status["target_hash"] = status["saved_hash"]
+                if status["state"] == "running":
+                    status["state"] = "failed" if error else "done"
+                self.lock.notify_all()
@@ -0,0 +1,341 @@
+# Append-only store for the grocery list log
+# Each export only writes its own rows into a SQLite database (WAL mode) instead of rewriting Grocery_List_Log.xlsx.
+# The Excel log can still be produced on demand with export_log_to_excel().
+# Summaries used on every rerun (favorite recipes, extras of the last export) are kept up to date on each append,
+# so reading them does not depend on the length of the log.
+
+import os
+import sqlite3
+import pandas as pd
+from openpyxl import load_workbook
+from xlsx_writer import write_xlsx
+
+# Sheet name in the Excel log => table and columns in the store
+LOG_TABLES = {
+    "Log Per Recipe": ("log_per_recipe", ["Recipe", "Portion", "Ingredient", "IngredientKey", "Amount", "Unit", "Notes", "ExportDate"]),
+    "Log Combined": ("log_combined", ["Ingredient", "Amount", "Unit", "ExportDate"]),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_per_recipe (
+    id INTEGER PRIMARY KEY,
+    Recipe TEXT, Portion INTEGER, Ingredient TEXT, IngredientKey TEXT, Amount REAL, Unit TEXT, Notes TEXT,
+    ExportDate TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_log_per_recipe_date ON log_per_recipe (ExportDate);
+CREATE TABLE IF NOT EXISTS log_combined (
+    id INTEGER PRIMARY KEY,
+    Ingredient TEXT, Amount REAL, Unit TEXT,
+    ExportDate TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_log_combined_date ON log_combined (ExportDate);
+CREATE TABLE IF NOT EXISTS recipe_summary (
+    Recipe TEXT PRIMARY KEY, Portion REAL NOT NULL, Frequency INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS last_extras (
+    Ingredient TEXT, Unit TEXT, Amount REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY, value TEXT
+);
+"""
+
+SUMMARY_VERSION = "1"
+
+# Dtypes of the log columns when read for analysis: repeated strings as categoricals, compact amounts
+LOG_DTYPES = {
+    "Recipe": "category", "Ingredient": "category", "IngredientKey": "category", "Unit": "category",
+    "Amount": "float32", "ExportDate": "datetime64[ns]",
+}
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def to_iso_date(values):
+    # ExportDate is stored as 'YYYY-MM-DD' text
+    return pd.to_datetime(values).dt.strftime("%Y-%m-%d")
+
+def prepare_rows(df, sheet_name, export_date=None):
+    _, columns = LOG_TABLES[sheet_name]
+    df = df.copy()
+    if export_date is not None:
+        df["ExportDate"] = export_date
+    df["ExportDate"] = to_iso_date(df["ExportDate"])
+    for col in columns:
+        if col not in df.columns:
+            df[col] = None
+    df = df[columns].astype(object).where(df[columns].notna(), None)
+    return columns, df.itertuples(index=False, name=None)
+
+def insert_rows(conn, sheet_name, df, export_date=None):
+    table, _ = LOG_TABLES[sheet_name]
+    columns, rows = prepare_rows(df, sheet_name, export_date)
+    conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows)
+
+def compute_extras(per_recipe_df, combined_df):
+    # Ingredients of an export that were added as an extra, not as part of a recipe
+    per_recipe_df = per_recipe_df.assign(Unit=per_recipe_df["Unit"].str.strip().str.lower())
+    combined_df = combined_df.assign(Unit=combined_df["Unit"].str.strip().str.lower())
+    combined_grouped = combined_df.groupby(["Ingredient", "Unit"], as_index=False)["Amount"].sum()
+    per_recipe_grouped = per_recipe_df.groupby(["Ingredient", "Unit"], as_index=False)["Amount"].sum()
+    extras = pd.merge(combined_grouped, per_recipe_grouped, on=["Ingredient", "Unit"], how="left", suffixes=("_combined", "_recipe"))
+    extras["Amount_recipe"] = extras["Amount_recipe"].fillna(0)
+    extras["Amount"] = extras["Amount_combined"] - extras["Amount_recipe"]
+    return extras[extras["Amount"] > 0][["Ingredient", "Unit", "Amount"]]
+
+def update_recipe_summary(conn, recipe_portions, sign):
+    # recipe_portions: distinct (Recipe, Portion) pairs of one export date, added (sign=1) or removed (sign=-1)
+    recipes = {recipe for recipe, _ in recipe_portions}
+    conn.executemany(
+        "INSERT INTO recipe_summary (Recipe, Portion, Frequency) VALUES (?, 0, 0) ON CONFLICT(Recipe) DO NOTHING",
+        [(recipe,) for recipe in recipes])
+    conn.executemany("UPDATE recipe_summary SET Portion = Portion + ? WHERE Recipe = ?",
+                     [(sign * portion, recipe) for recipe, portion in recipe_portions])
+    conn.executemany("UPDATE recipe_summary SET Frequency = Frequency + ? WHERE Recipe = ?",
+                     [(sign, recipe) for recipe in recipes])
+    conn.execute("DELETE FROM recipe_summary WHERE Frequency <= 0")
+
+def set_last_extras(conn, export_date, extras):
+    conn.execute("DELETE FROM last_extras")
+    conn.executemany("INSERT INTO last_extras (Ingredient, Unit, Amount) VALUES (?, ?, ?)",
+                     [(ingredient, unit, float(amount)) for ingredient, unit, amount
+                      in extras[["Ingredient", "Unit", "Amount"]].itertuples(index=False, name=None)])
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_export_date', ?)", (export_date,))
+
+def get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def rebuild_summaries(conn):
+    # Full recompute from the log rows, only needed after a migration or a summary format change
+    conn.execute("DELETE FROM recipe_summary")
+    conn.execute("""
+        INSERT INTO recipe_summary (Recipe, Portion, Frequency)
+        SELECT Recipe, SUM(Portion), COUNT(DISTINCT ExportDate)
+        FROM (SELECT DISTINCT Recipe, ExportDate, Portion FROM log_per_recipe)
+        GROUP BY Recipe""")
+    last_date = conn.execute("SELECT MAX(ExportDate) FROM log_combined").fetchone()[0]
+    if last_date is None:
+        conn.execute("DELETE FROM last_extras")
+    else:
+        per_recipe_df = pd.read_sql_query("SELECT Ingredient, Unit, Amount FROM log_per_recipe WHERE ExportDate = ?", conn, params=(last_date,))
+        combined_df = pd.read_sql_query("SELECT Ingredient, Unit, Amount FROM log_combined WHERE ExportDate = ?", conn, params=(last_date,))
+        set_last_extras(conn, last_date, compute_extras(per_recipe_df, combined_df))
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('summary_version', ?)", (SUMMARY_VERSION,))
+
+def append_export(db_path, per_recipe_df, combined_df, export_date):
+    """Write one export to the log. Only 1 export a day is kept: rows of an earlier export on the same date are replaced."""
+    export_date = to_iso_date(pd.Series([export_date])).iloc[0]
+    conn = connect(db_path)
+    try:
+        with conn:
+            # Take the export that is replaced out of the summaries
+            previous = conn.execute("SELECT DISTINCT Recipe, Portion FROM log_per_recipe WHERE ExportDate = ?", (export_date,)).fetchall()
+            update_recipe_summary(conn, previous, -1)
+
+            for sheet_name, df in [("Log Per Recipe", per_recipe_df), ("Log Combined", combined_df)]:
+                table, _ = LOG_TABLES[sheet_name]
+                conn.execute(f"DELETE FROM {table} WHERE ExportDate = ?", (export_date,))
+                insert_rows(conn, sheet_name, df, export_date)
+
+            current = per_recipe_df[["Recipe", "Portion"]].drop_duplicates()
+            update_recipe_summary(conn, [(recipe, int(portion)) for recipe, portion in current.itertuples(index=False, name=None)], 1)
+            last_date = get_meta(conn, "last_export_date")
+            if last_date is None or export_date >= last_date:
+                set_last_extras(conn, export_date, compute_extras(per_recipe_df, combined_df))
+    finally:
+        conn.close()
+
+def read_log(db_path, sheet_name, after_id=0):
+    """Rows of one log sheet as a DataFrame. after_id > 0 only returns rows written after that id (incremental read)."""
+    table, columns = LOG_TABLES[sheet_name]
+    conn = connect(db_path)
+    try:
+        df = pd.read_sql_query(
+            f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > ? ORDER BY id", conn, params=(after_id,))
+    finally:
+        conn.close()
+    return df.set_index("id")
+
+def pin_dtypes(df, dtypes):
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        if dtype == "datetime64[ns]":
+            df[col] = pd.to_datetime(df[col]).astype(dtype)
+        elif dtype == "float32":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def concat_chunks(chunks, columns):
+    # Categoricals of different chunks are merged into one sorted category set instead of falling back to object
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(chunks, ignore_index=True)
+    for col in columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype) and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = pd.api.types.union_categoricals([chunk[col] for chunk in chunks], sort_categories=True)
+    return df
+
+def date_filter(start=None, end=None):
+    # SQL condition and parameters for an ExportDate range (ISO text compares like dates), either bound may be None
+    conditions, params = [], []
+    if start is not None:
+        conditions.append("ExportDate >= ?")
+        params.append(to_iso_date(pd.Series([start])).iloc[0])
+    if end is not None:
+        conditions.append("ExportDate <= ?")
+        params.append(to_iso_date(pd.Series([end])).iloc[0])
+    return (" AND ".join(conditions) or "1 = 1"), params
+
+def iter_log_chunks(db_path, sheet_name, columns=None, start=None, end=None, chunk_size=50_000, dtypes=LOG_DTYPES):
+    """DataFrames of chunk_size rows of one log sheet, with only the requested columns and pinned dtypes.
+    start/end (dates, inclusive) are pushed down to the query, so rows outside the range are never read."""
+    table, all_columns = LOG_TABLES[sheet_name]
+    columns = columns or all_columns
+    condition, params = date_filter(start, end)
+    conn = connect(db_path)
+    try:
+        for chunk in pd.read_sql_query(f"SELECT {', '.join(columns)} FROM {table} WHERE {condition} ORDER BY id",
+                                       conn, params=params, chunksize=chunk_size):
+            yield pin_dtypes(chunk, dtypes)
+    finally:
+        conn.close()
+
+def read_log_frame(db_path, sheet_name, columns=None, start=None, end=None, chunk_size=50_000, dtypes=LOG_DTYPES):
+    """One log sheet for analysis: see iter_log_chunks"""
+    columns = columns or LOG_TABLES[sheet_name][1]
+    return concat_chunks(list(iter_log_chunks(db_path, sheet_name, columns, start, end, chunk_size, dtypes)), columns)
+
+def read_log_dates(db_path):
+    """Sorted export dates in the log (as datetime.date), without reading the rows"""
+    conn = connect(db_path)
+    try:
+        rows = conn.execute("SELECT DISTINCT ExportDate FROM log_combined ORDER BY ExportDate").fetchall()
+    finally:
+        conn.close()
+    return [date.date() for date in pd.to_datetime([row[0] for row in rows])]
+
+def iter_excel_log_chunks(xlsx_path, sheet_name, columns=None, start=None, end=None, chunk_size=50_000, dtypes=LOG_DTYPES):
+    """Same as iter_log_chunks for a sheet of Grocery_List_Log.xlsx, streamed with openpyxl read_only/iter_rows.
+    Only the requested columns are kept, rows outside start/end are dropped per chunk."""
+    workbook = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = columns or [col for col in LOG_TABLES[sheet_name][1] if col in header]
+        positions = [header.index(col) if col in header else None for col in columns]
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+
+        def to_frame(buffer):
+            df = pd.DataFrame(buffer, columns=columns)
+            if (start is not None or end is not None) and "ExportDate" in df.columns:
+                export_date = pd.to_datetime(df["ExportDate"]).dt.normalize()
+                keep = pd.Series(True, index=df.index)
+                if start is not None:
+                    keep &= export_date >= start
+                if end is not None:
+                    keep &= export_date <= end
+                df = df[keep].reset_index(drop=True)
+            return pin_dtypes(df, dtypes)
+
+        buffer = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            buffer.append(tuple(row[position] if position is not None and position < len(row) else None for position in positions))
+            if len(buffer) >= chunk_size:
+                yield to_frame(buffer)
+                buffer = []
+        if buffer:
+            yield to_frame(buffer)
+    finally:
+        workbook.close()
+
+def last_log_id(db_path, sheet_name):
+    table, _ = LOG_TABLES[sheet_name]
+    conn = connect(db_path)
+    try:
+        return conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+def migrate_excel_log(xlsx_path, db_path):
+    """One-shot import of the existing Grocery_List_Log.xlsx. Does nothing if the store already has rows."""
+    conn = connect(db_path)
+    try:
+        if any(conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table, _ in LOG_TABLES.values()):
+            print(f"Log store {db_path} already has data, skipping migration")
+            return 0
+        migrated = 0
+        with conn:
+            for sheet_name in LOG_TABLES:
+                # Streamed in chunks, values are stored as they are in the sheet (no dtype pinning)
+                for df in iter_excel_log_chunks(xlsx_path, sheet_name, dtypes={}):
+                    insert_rows(conn, sheet_name, df)
+                    migrated += len(df)
+            rebuild_summaries(conn)
+        return migrated
+    finally:
+        conn.close()
+
+def ensure_log_store(db_path, xlsx_path):
+    # First run after switching to the store: import the Excel log
+    if not os.path.exists(db_path) and os.path.exists(xlsx_path):
+        migrate_excel_log(xlsx_path, db_path)
+        return
+    # Store written before the summaries existed (or with an older format)
+    if os.path.exists(db_path):
+        conn = connect(db_path)
+        try:
+            if get_meta(conn, "summary_version") != SUMMARY_VERSION:
+                with conn:
+                    rebuild_summaries(conn)
+        finally:
+            conn.close()
+
+def read_favorite_recipes(db_path, top_n=5):
+    """Recipes with the highest average portions per export: Recipe, Portion (sum), Frequency (# exports), AvgPortion"""
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query("""
+            SELECT Recipe, Portion, Frequency, Portion * 1.0 / Frequency AS AvgPortion
+            FROM recipe_summary ORDER BY AvgPortion DESC, Recipe LIMIT ?""", conn, params=(top_n,))
+    finally:
+        conn.close()
+
+def read_last_extras(db_path):
+    """Ingredients that were added as an extra in the last export: Ingredient, Unit, Amount"""
+    conn = connect(db_path)
+    try:
+        return pd.read_sql_query("SELECT Ingredient, Unit, Amount FROM last_extras ORDER BY Ingredient, Unit", conn)
+    finally:
+        conn.close()
+
+def iter_log_rows(db_path, sheet_name, chunk_size=10_000):
+    """Rows of one log sheet as tuples (LOG_TABLES columns), fetched chunk_size rows at a time"""
+    table, columns = LOG_TABLES[sheet_name]
+    conn = connect(db_path)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY id")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def export_log_to_excel(db_path, target, chunk_size=10_000):
+    """Write the full log to an Excel file (path or BytesIO) with the same sheets as Grocery_List_Log.xlsx.
+    Rows are streamed from the store into a write_only workbook, memory does not grow with the log."""
+    write_xlsx(target, [(sheet_name, columns, iter_log_rows(db_path, sheet_name, chunk_size))
+                        for sheet_name, (_, columns) in LOG_TABLES.items()])
@@ -4,13 +4,183 @@
 # Importing Libraries
 from datetime import date   
 import pandas as pd
+import numpy as np
 import math
 import sys
 import os
+import hashlib
+import pickle
+import heapq
+import threading
+from array import array
+from collections import namedtuple
+from collections.abc import MutableMapping
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "Colruyt_scraping")))
 
+# INGREDIENT TABLE
+# Ingredients are stored column wise (one array per numeric field) instead of one object with a __dict__ per ingredient.
+# IngredientDict[key] returns a small IngredientRecord view, so getIngr(...).kcal_100g etc. keep working.
+class IngredientRecord:
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    name = property(lambda self: self.table.names[self.row])
+    url = property(lambda self: self.table.urls[self.row])
+    priceurl = property(lambda self: self.table.priceurls[self.row])
+    gramPerUnit = property(lambda self: self.table.gramPerUnit[self.row])
+    kcal_100g = property(lambda self: self.table.kcal_100g[self.row])
+    prot_100g = property(lambda self: self.table.prot_100g[self.row])
+    # Unit values are stored when the row is written, like Ingredient computes them in __init__
+    kcal_unit = property(lambda self: self.table.kcal_unit[self.row])
+    prot_unit = property(lambda self: self.table.prot_unit[self.row])
+    protPer100Kcal = property(lambda self: self.table.protPer100Kcal[self.row])
+
+    def getLabel(self):
+        return self.name
+
+    def __eq__(self, other):
+        return isinstance(other, IngredientRecord) and self.table is other.table and self.row == other.row
+
+    def __hash__(self):
+        return hash((id(self.table), self.row))
+
+    def __repr__(self):
+        return f"IngredientRecord({self.name!r})"
+
+
+def unitValues(gramPerUnit, kcal_100g, prot_100g):
+    # (kcal_unit, prot_unit, protPer100Kcal), same formulas as Ingredient.__init__
+    return ((gramPerUnit * (kcal_100g/100)) if kcal_100g>0 else 0,
+            (gramPerUnit * (prot_100g/100)) if prot_100g>0 else 0,
+            (prot_100g / kcal_100g*100) if kcal_100g>0 else 0)
+
+
+class IngredientTable(MutableMapping):
+    NUMERIC_COLUMNS = ('gramPerUnit', 'kcal_100g', 'prot_100g')
+    DERIVED_COLUMNS = ('kcal_unit', 'prot_unit', 'protPer100Kcal')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.lookup = None   # cached (pd.Index of keys, rows) for rows()
+        self.index = {}   # name key => row
+        self.names = []
+        self.urls = []
+        self.priceurls = []
+        self.gramPerUnit = array('d')
+        self.kcal_100g = array('d')
+        self.prot_100g = array('d')
+        self.kcal_unit = array('d')
+        self.prot_unit = array('d')
+        self.protPer100Kcal = array('d')
+
+    def columns(self):
+        # Every per row column, in a fixed order
+        return (self.names, self.urls, self.priceurls, self.gramPerUnit, self.kcal_100g, self.prot_100g,
+                self.kcal_unit, self.prot_unit, self.protPer100Kcal)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __getitem__(self, key):
+        return IngredientRecord(self, self.index[key])
+
+    def __setitem__(self, key, ingredient):
+        # Accepts anything with the Ingredient attributes (Ingredient, IngredientRecord)
+        values = (ingredient.name, ingredient.url, ingredient.priceurl,
+                  float(ingredient.gramPerUnit), float(ingredient.kcal_100g), float(ingredient.prot_100g))
+        row = self.index.get(key)
+        if row is None:
+            self.append(key, *values)
+        else:
+            for column, value in zip(self.columns(), values + unitValues(*values[3:])):
+                column[row] = value
+        # The recipe indexes hold values computed from the old row
+        invalidate_recipe_indexes(ingredient=key)
+
+    def __delitem__(self, key):
+        # The last row is moved into the freed one, so the columns keep no dead rows.
+        # Deletes are rare (the app reloads a whole new table instead): an IngredientRecord taken before a delete
+        # may point at the moved row afterwards, look it up again.
+        row = self.index.pop(key)
+        last = len(self.names) - 1
+        if row != last:
+            for column in self.columns():
+                column[row] = column[last]
+            moved_key = next(k for k, r in self.index.items() if r == last)
+            self.index[moved_key] = row
+        for column in self.columns():
+            del column[last]
+        self.lookup = None
+        invalidate_recipe_indexes(ingredient=key)
+
+    def append(self, key, name, url, priceurl, gramPerUnit, kcal_100g, prot_100g):
+        self.lookup = None
+        self.index[key] = len(self.names)
+        self.names.append(name)
+        self.urls.append(url)
+        self.priceurls.append(priceurl)
+        self.gramPerUnit.append(gramPerUnit)
+        self.kcal_100g.append(kcal_100g)
+        self.prot_100g.append(prot_100g)
+        kcal_unit, prot_unit, protPer100Kcal = unitValues(gramPerUnit, kcal_100g, prot_100g)
+        self.kcal_unit.append(kcal_unit)
+        self.prot_unit.append(prot_unit)
+        self.protPer100Kcal.append(protPer100Kcal)
+
+    def extend(self, keys, names, urls, priceurls, gramPerUnit, kcal_100g, prot_100g):
+        # Bulk append, keys must be unique and not yet in the table
+        self.lookup = None
+        start = len(self.names)
+        self.index.update(zip(keys, range(start, start + len(keys))))
+        self.names.extend(names)
+        self.urls.extend(urls)
+        self.priceurls.extend(priceurls)
+        gram, kcal, prot = (np.asarray(values, dtype=np.float64) for values in (gramPerUnit, kcal_100g, prot_100g))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            kcal_unit = np.where(kcal > 0, gram * (kcal / 100), 0)
+            prot_unit = np.where(prot > 0, gram * (prot / 100), 0)
+            protPer100Kcal = np.where(kcal > 0, prot / kcal * 100, 0)
+        for column, values in zip(self.columns()[3:], (gram, kcal, prot, kcal_unit, prot_unit, protPer100Kcal)):
+            column.frombytes(np.asarray(values, dtype=np.float64).tobytes())
+
+    def rows(self, keys):
+        """Row numbers for an array/Series of keys, -1 for unknown keys"""
+        if self.lookup is None:
+            self.lookup = (pd.Index(list(self.index)), np.fromiter(self.index.values(), dtype=np.int64, count=len(self.index)))
+        key_index, key_rows = self.lookup
+        positions = key_index.get_indexer(pd.Index(keys, dtype=object))
+        return np.where(positions >= 0, key_rows[positions], -1)
+
+    def column(self, col):
+        """Numpy copy of a numeric column, aligned with the rows of the table"""
+        if col not in self.NUMERIC_COLUMNS + self.DERIVED_COLUMNS:
+            raise KeyError(col)
+        return np.frombuffer(getattr(self, col), dtype=np.float64).copy()
+
+    def toDataFrame(self):
+        # One row per reachable ingredient, indexed by name key
+        keys = list(self.index)
+        rows = np.fromiter(self.index.values(), dtype=np.int64, count=len(keys))
+        df = pd.DataFrame({col: self.column(col)[rows]
+                           for col in self.NUMERIC_COLUMNS + self.DERIVED_COLUMNS},
+                          index=pd.Index(keys, name='IngredientKey'))
+        df.insert(0, 'name', [self.names[row] for row in rows])
+        return df
+
+
 # Global dictionaries
-IngredientDict = {}
+IngredientDict = IngredientTable()
 RecipeDict = {}
 
 # Std variables
@@ -45,7 +215,7 @@ class Ingredient:
         self.prot_unit = (gramPerUnit * ( self.prot_100g/100) ) if self.prot_100g>0 else 0 #return n / d if d else 0
         self.protPer100Kcal = (self.prot_100g / self.kcal_100g*100) if self.kcal_100g>0 else 0
     
-        # Add the ingredient to the global dictionary
+        # Add the ingredient to the global dictionary (which invalidates the recipe indexes using it)
         IngredientDict[name_key] = self
         
     # Methods for Ingredient Object
@@ -55,10 +225,15 @@ class Ingredient:
         
 # Make a class for Recipe => Append to RecipeDict on creation
 class Recipe:
-    def __init__(self,name,ingredientsRecipe={}):
+    # ingredients/recipes: the IngredientTable the recipe is checked against and the dict it is added to.
+    # By default the global IngredientDict/RecipeDict, the loaders pass the new ones they are building.
+    def __init__(self,name,ingredientsRecipe={}, ingredients=None, recipes=None):
         self.name = name 
         self.ingredientsRecipe = ingredientsRecipe 
         name_key = self.name.replace(" ","").upper()
+        is_global = recipes is None
+        ingredients = IngredientDict if ingredients is None else ingredients
+        recipes = RecipeDict if recipes is None else recipes
         
         # Does Recipe have ingredients?
         if not ingredientsRecipe:
@@ -68,17 +243,25 @@ class Recipe:
         for ingredient in ingredientsRecipe:
                 key1 = ingredient
                 key2 = ingredient.replace(" ", "").upper()
-                if key1 not in IngredientDict and key2 not in IngredientDict:
+                if key1 not in ingredients and key2 not in ingredients:
                     print(f"Cannot add recipe {self.name}. Ingredient '{ingredient}' is not in the global ingredient list.")
                     return
 
         # Only add object to RecipeDict if does not already exist
-        if name_key in RecipeDict:
+        if name_key in recipes:
             print(f'Recipe {self.name} already exists')
             return
         
         # Add the ingredient to the global dictionary
-        RecipeDict[name_key] = self
+        recipes[name_key] = self
+        if is_global:
+            invalidate_recipe_indexes(recipe=name_key)
+
+    @classmethod
+    def from_rows(cls, name, rows, ingredients=None, recipes=None):
+        """Recipe from (ingredient, amount, unit) rows, e.g. the lines of the Recipes sheet"""
+        ingredientsRecipe = {ingredient: {'amount': amount, 'unit': unit} for ingredient, amount, unit in rows}
+        return cls(name, ingredientsRecipe, ingredients, recipes)
 
 
     # Methods for Recipe Object
@@ -121,50 +304,58 @@ def getIngr(name):
     return name
 
 
+def getIngrValue(ingredient, col):
+    # Reads the column array of the table directly, without building an IngredientRecord for it
+    if isinstance(ingredient, str):
+        row = IngredientDict.index.get(ingredient.replace(' ','').upper())  # makeKey, inlined
+        if row is not None:
+            return getattr(IngredientDict, col)[row]
+        ingredient = getIngr(ingredient)  # Warns that the ingredient is unknown
+    elif isinstance(ingredient, IngredientRecord):
+        return getattr(ingredient.table, col)[ingredient.row]
+    return float(getattr(ingredient, col))
+
 def getIngrKcal100g(ingredient):
-    ingredient = getIngr(ingredient)
-    return  float(ingredient.kcal_100g)
+    return getIngrValue(ingredient, 'kcal_100g')
 
 def getIngrProt100g(ingredient):
-    ingredient = getIngr(ingredient)
-    return  float(ingredient.prot_100g )
+    return getIngrValue(ingredient, 'prot_100g')
 
 def getIngrGramPerUnit(ingredient):
-    ingredient = getIngr(ingredient)
-    return  float(ingredient.gramPerUnit)
+    return getIngrValue(ingredient, 'gramPerUnit')
 
 def getIngrKcalPerUnit(ingredient):
-    ingredient = getIngr(ingredient)
-    return  float(ingredient.kcal_unit)
+    return getIngrValue(ingredient, 'kcal_unit')
 
 def getIngrProtPerUnit(ingredient):
-    ingredient = getIngr(ingredient)
-    return  float(ingredient.prot_unit)
+    return getIngrValue(ingredient, 'prot_unit')
 
 def getIngrKcal(ingredient, amount=0, unitOrGram='g'):
         if is_number(amount):
-            ingredient_obj = getIngr(ingredient)
-            if not ingredient_obj:
+            if isinstance(ingredient, str) and makeKey(ingredient) not in IngredientDict:
+                ingredient = getIngr(ingredient)  # Warns, gives None
+            if not ingredient:
                 return 0
             unitOrGram = unitOrGram.strip().lower()
             if unitOrGram == 'u':
-                return float(amount * getIngrKcalPerUnit(ingredient_obj))
+                return float(amount * getIngrKcalPerUnit(ingredient))
             if unitOrGram == 'g':
-                return float(amount * (getIngrKcal100g(ingredient_obj)/100))
+                return float(amount * (getIngrKcal100g(ingredient)/100))
         else:
             print(f'Amount must be numeric.')
             return 0
     
 def getIngrProt(ingredient, amount=0, unitOrGram='g'):
         if is_number(amount):
-            ingredient_obj = getIngr(ingredient)
-            if not ingredient_obj:
+            if isinstance(ingredient, str) and makeKey(ingredient) not in IngredientDict:
+                ingredient = getIngr(ingredient)  # Warns, gives None
+            if not ingredient:
                 return 0
             unitOrGram = unitOrGram.strip().lower()
             if unitOrGram == 'u':
-                return float(amount * getIngrProtPerUnit(ingredient_obj))
+                return float(amount * getIngrProtPerUnit(ingredient))
             if unitOrGram == 'g':
-                return float(amount * (getIngrProt100g(ingredient_obj)/100))
+                return float(amount * (getIngrProt100g(ingredient)/100))
         else:
             print(f'Amount must be numeric.')
             return 0
@@ -191,12 +382,11 @@ def getRecipeKcal(name, portion=1):
     ingredients = getRecipeIngr(name)
     # Loop over each ingredient in recipe
     for key , values in ingredients:
-        ingredient = getIngr(key)
         # Get amount and unit for Ingredient from Recipe
         amount = values.get('amount')*portion 
         unit = values.get('unit')
         if key:
-            total_kcal += getIngrKcal(ingredient, amount, unit)
+            total_kcal += getIngrKcal(key, amount, unit)
     return round(float(total_kcal),2)
 
 def getRecipeProt(name, portion=1):
@@ -204,12 +394,11 @@ def getRecipeProt(name, portion=1):
     ingredients = getRecipeIngr(name)
     # Loop over each ingredient in recipe
     for key , values in ingredients:
-        ingredient = getIngr(key)
         # Get amount and unit for Ingredient from Recipe
         amount = values.get('amount')*portion 
         unit = values.get('unit')
         if key:
-            total_prot += getIngrProt(ingredient, amount, unit)
+            total_prot += getIngrProt(key, amount, unit)
     return round(float(total_prot),2)
       
 def getRecipeProtPer100Kcal(name):
@@ -217,16 +406,231 @@ def getRecipeProtPer100Kcal(name):
     total_prot = getRecipeProt(name,1)
     return round(float( total_prot/total_kcal*100 ),2 )
 
-def convert_to_units(df, unit_col="Unit", amount_col="Amount"):
-    """Convert g -> u where needed using getIngrGramPerUnit(ingredient)"""
+def compute_nutrition(df, key_col="IngredientKey", amount_col="Amount", unit_col="Unit", ingredients=None):
+    """Vectorized getIngrKcal/getIngrProt for a whole DataFrame (same shape as Recipe.toDataFrameRows).
+    Returns a copy with 'Kcal' and 'Prot' columns: unknown ingredients and non numeric amounts give 0, units other than g/u give NaN.
+    ingredients: the IngredientTable to use, IngredientDict by default."""
+    ingredients = IngredientDict if ingredients is None else ingredients
     df = df.copy()
-    df_all_g = df[unit_col] == "g"
-    df.loc[df_all_g, "Amount"] = df.loc[df_all_g].apply(
-        lambda row: row[amount_col] / getIngrGramPerUnit(row["Ingredient"]), axis=1
-    )
-    df["Unit"] = "u"
+    keys = df[key_col].astype(str).str.replace(" ","", regex=False).str.upper().to_numpy(dtype=object)
+    rows = ingredients.rows(keys)
+    known = rows >= 0
+    rows = np.where(known, rows, 0)
+
+    amount = pd.to_numeric(df[amount_col], errors='coerce').to_numpy(dtype=float)
+    unit = df[unit_col].astype(str).str.strip().str.lower().to_numpy(dtype=object)
+    is_g = unit == 'g'
+    is_u = unit == 'u'
+    valid = known & ~np.isnan(amount)
+
+    for col, per_100g, per_unit in [('Kcal', 'kcal_100g', 'kcal_unit'), ('Prot', 'prot_100g', 'prot_unit')]:
+        values_100g = ingredients.column(per_100g)
+        values_unit = ingredients.column(per_unit)
+        if len(values_100g) == 0:
+            values_100g = values_unit = np.zeros(1)
+        result = np.full(len(df), np.nan)
+        result[is_g] = amount[is_g] * (values_100g[rows[is_g]] / 100)
+        result[is_u] = amount[is_u] * values_unit[rows[is_u]]
+        result[(is_g | is_u) & ~valid] = 0
+        df[col] = result
     return df
 
+# RECIPE NUTRITION INDEX
+# Kcal, protein and protein/100 kcal for 1 portion of every recipe, computed once instead of on every call.
+# Entries are recomputed lazily after invalidate_recipe_indexes() marks them dirty.
+# Like the other recipe indexes it is built from one RecipeDict/IngredientDict pair (see publish_data): a reload builds
+# new index objects instead of rebuilding these in place. The lock only serializes (re)computing after an invalidation,
+# readers never wait for it unless the values they ask for are dirty.
+class RecipeNutritionIndex:
+    def __init__(self, recipes, ingredients):
+        self.recipes = recipes          # the RecipeDict and IngredientDict the values are computed from
+        self.ingredients = ingredients
+        self.lock = threading.Lock()
+        self.values = {}                # recipe key => (kcal, prot, protPer100Kcal) for 1 portion
+        self.dirty = set(recipes)       # recipe keys that need to be (re)computed
+        self.ingredientRecipes = {}     # ingredient key => recipe keys using that ingredient
+
+    def invalidate(self, recipe=None, ingredient=None):
+        with self.lock:
+            if recipe is None and ingredient is None:
+                self.values = {}
+                self.ingredientRecipes = {}
+                self.dirty = set(self.recipes)
+                return
+            if recipe is not None:
+                self.dirty.add(makeKey(recipe))
+            if ingredient is not None:
+                self.dirty.update(self.ingredientRecipes.get(makeKey(ingredient), ()))
+
+    def refresh(self):
+        # Same values as getRecipeKcal/getRecipeProt, computed with compute_nutrition for all dirty recipes at once.
+        # A line that cannot be computed (unit other than g/u, blank unit) is left out with a warning instead of
+        # raising, a data problem must not stop the app from loading.
+        # New dicts are filled and assigned at the end, a reader never sees a half refreshed one.
+        with self.lock:
+            if not self.dirty:
+                return
+            values = {key: value for key, value in self.values.items() if key not in self.dirty}
+            ingredientRecipes = {key: set(recipe_keys) for key, recipe_keys in self.ingredientRecipes.items()}
+            dirty = [recipe_key for recipe_key in self.recipes if recipe_key in self.dirty]
+            if dirty:
+                self.computeValues(dirty, values, ingredientRecipes)
+            self.values, self.ingredientRecipes = values, ingredientRecipes
+            self.dirty = set()
+
+    def computeValues(self, dirty, values, ingredientRecipes):
+        recipes = self.recipes
+        lines = pd.DataFrame(
+            [(recipe_key, ingredient, line.get('amount', 0), line.get('unit', ""))
+             for recipe_key in dirty for ingredient, line in recipes[recipe_key].ingredientsRecipe.items()],
+            columns=["RecipeKey", "IngredientKey", "Amount", "Unit"])
+        lines = compute_nutrition(lines, ingredients=self.ingredients)
+        for recipe_key, ingredient, unit in lines.loc[lines["Kcal"].isna(), ["RecipeKey", "IngredientKey", "Unit"]].itertuples(index=False):
+            print(f"Warning: Recipe '{recipe_key}': unit {unit!r} of ingredient '{ingredient}' is not g or u, left out of the nutrition values")
+        # Summed line by line like getRecipeKcal (a pairwise/compensated sum can round differently)
+        totals = {recipe_key: [0.0, 0.0] for recipe_key in dirty}
+        for recipe_key, kcal, prot in zip(lines["RecipeKey"].tolist(), lines["Kcal"].fillna(0).tolist(), lines["Prot"].fillna(0).tolist()):
+            totals[recipe_key][0] += kcal
+            totals[recipe_key][1] += prot
+        for recipe_key, (kcal, prot) in totals.items():
+            kcal, prot = round(float(kcal), 2), round(float(prot), 2)
+            protPer100Kcal = round(float(prot / kcal * 100), 2) if kcal else 0
+            values[recipe_key] = (kcal, prot, protPer100Kcal)
+            for ingredient in recipes[recipe_key].ingredientsRecipe:
+                ingredientRecipes.setdefault(makeKey(ingredient), set()).add(recipe_key)
+
+    def get(self, name):
+        if self.dirty:
+            self.refresh()
+        return self.values.get(makeKey(name))
+
+    def toDataFrame(self):
+        if self.dirty:
+            self.refresh()
+        values = self.values
+        return pd.DataFrame(
+            [(key, recipe.getLabel(), *values[key]) for key, recipe in self.recipes.items() if key in values],
+            columns=["RecipeKey", "RecipeLabel", "RecipeKcal1Port", "RecipeProt1Port", "RecipeProtPer100Kcal"])
+
+RecipeNutrition = RecipeNutritionIndex(RecipeDict, IngredientDict)
+
+def invalidate_recipe_indexes(recipe=None, ingredient=None):
+    # No arguments => the whole index is rebuilt on next access
+    RecipeNutrition.invalidate(recipe, ingredient)
+    RecipeMatrix.stale = True
+    RecipeAttributes.stale = True
+    RecipeSeasons.stale = True
+
+def getRecipeNutrition(name):
+    """Returns {'kcal', 'prot', 'protPer100Kcal'} for 1 portion of a recipe, or None if the recipe is unknown"""
+    values = RecipeNutrition.get(name)
+    if values is None:
+        print(f"Warning: Recipe '{name}' not found in RecipeDict.")
+        return None
+    kcal, prot, protPer100Kcal = values
+    return {'kcal': kcal, 'prot': prot, 'protPer100Kcal': protPer100Kcal}
+
+def get_recipe_nutrition_df():
+    return RecipeNutrition.toDataFrame()
+
+def get_gram_per_unit(ingredients, table=None):
+    """gramPerUnit per entry of a Series of ingredient names/keys, NaN when unknown or not positive.
+    Keys are normalized per unique value only, so this stays cheap on long logs.
+    table: the IngredientTable to use, IngredientDict by default."""
+    table = IngredientDict if table is None else table
+    codes, uniques = pd.factorize(ingredients)
+    keys = pd.Index(uniques).astype(str).str.replace(" ","", regex=False).str.upper()
+    rows = table.rows(keys)
+    gram_per_unit = table.column('gramPerUnit')
+    unique_gpu = np.where(rows >= 0, gram_per_unit[rows] if len(gram_per_unit) else np.nan, np.nan)
+    unique_gpu[~(unique_gpu > 0)] = np.nan
+    # Missing ingredient names (code -1) map to NaN as well
+    return np.append(unique_gpu, np.nan)[codes]
+
+def convert_to_units(df, unit_col="Unit", amount_col="Amount", mode="u", ingredient_col="Ingredient", overrides=None):
+    """Convert amounts between g and u using the gramPerUnit of each ingredient
+    mode='u'     : g -> u (default)
+    mode='g'     : u -> g
+    mode='mixed' : every ingredient to the unit it is used with most in df (g on a tie)
+    overrides    : {ingredient key: 'u' or 'g'} target unit for those ingredients, whatever the mode
+    Rows of unknown ingredients (or gramPerUnit 0) keep their original amount and unit."""
+    df = df.copy()
+    unit = df[unit_col].astype(str).str.strip().str.lower().to_numpy(dtype=object, copy=True)
+    amount = pd.to_numeric(df[amount_col], errors='coerce').to_numpy(dtype=float, copy=True)
+    gram_per_unit = get_gram_per_unit(df[ingredient_col])
+
+    if mode == "u":
+        target = np.full(len(df), "u", dtype=object)
+    elif mode == "g":
+        target = np.full(len(df), "g", dtype=object)
+    elif mode == "mixed":
+        counts = pd.DataFrame({"Ingredient": df[ingredient_col].to_numpy(), "is_u": unit == "u", "is_g": unit == "g"})
+        counts = counts.groupby("Ingredient", sort=False, dropna=False, observed=True)[["is_u", "is_g"]].transform("sum")
+        target = np.where(counts["is_u"].to_numpy() > counts["is_g"].to_numpy(), "u", "g").astype(object)
+    else:
+        raise ValueError(f"Unknown mode '{mode}', use 'u', 'g' or 'mixed'")
+    if overrides:
+        # Looked up per unique ingredient, like get_gram_per_unit
+        codes, uniques = pd.factorize(df[ingredient_col])
+        keys = pd.Index(uniques).astype(str).str.replace(" ","", regex=False).str.upper()
+        forced = np.append(np.array([overrides.get(key) for key in keys], dtype=object), None)[codes]
+        target = np.where(pd.notna(forced), forced, target)
+
+    convertible = ~np.isnan(gram_per_unit)
+    g_to_u = convertible & (unit == "g") & (target == "u")
+    u_to_g = convertible & (unit == "u") & (target == "g")
+    amount[g_to_u] = amount[g_to_u] / gram_per_unit[g_to_u]
+    amount[u_to_g] = amount[u_to_g] * gram_per_unit[u_to_g]
+    unit[g_to_u] = "u"
+    unit[u_to_g] = "g"
+
+    df[amount_col] = amount
+    df[unit_col] = unit
+    return df
+
+# UNIT NORMALIZATION
+# Canonical unit and rounding step per ingredient key for a normalized grocery list. Ingredients that are not listed
+# go to the unit they are used with most in the list, totals are rounded up to UNIT_ROUNDING of their unit.
+UNIT_ROUNDING = {"g": 1, "u": 0.01}
+
+ingredient_units = {
+    # Bought per piece: whole units
+    "EI": ("u", 1),
+    "APPEL": ("u", 1),
+    "AVOCADO": ("u", 1),
+    "BAGUETTE": ("u", 1),
+    "HAMBURGERBROODJE": ("u", 1),
+    "MANDARIJN": ("u", 1),
+    "PEER": ("u", 1),
+    "RODEPAPRIKA": ("u", 1),
+    "RODEUI": ("u", 1),
+    "TOMAAT": ("u", 1),
+    "VEGGIEBURGER": ("u", 1),
+    "WORTEL": ("u", 1),
+    "WRAP": ("u", 1),
+}
+
+def normalize_units(df, unit_col="Unit", amount_col="Amount", ingredient_col="Ingredient"):
+    """Merge the g and u rows of each ingredient: rows are converted to the canonical unit of their ingredient
+    (ingredient_units, else the unit it is used with most in df), summed per (ingredient, unit) and rounded up.
+    Returns the grouped rows with the ingredient, amount and unit columns."""
+    overrides = {key: unit for key, (unit, _) in ingredient_units.items()}
+    converted = convert_to_units(df[[ingredient_col, amount_col, unit_col]], unit_col, amount_col, mode="mixed",
+                                 ingredient_col=ingredient_col, overrides=overrides)
+    grouped = converted.groupby([ingredient_col, unit_col], as_index=False, observed=True)[amount_col].sum()
+
+    keys = grouped[ingredient_col].astype(str).str.replace(" ","", regex=False).str.upper()
+    unit = grouped[unit_col].to_numpy(dtype=object)
+    step = grouped[unit_col].map(UNIT_ROUNDING).to_numpy(dtype=float, copy=True)
+    for row, (key, row_unit) in enumerate(zip(keys, unit)):
+        if key in ingredient_units and ingredient_units[key][0] == row_unit:
+            step[row] = ingredient_units[key][1]
+    amount = grouped[amount_col].to_numpy(dtype=float)
+    rounded = np.round(np.ceil(np.round(amount / step, 9)) * step, 6)
+    # Units without a rounding step are left as they are
+    grouped[amount_col] = np.where(np.isnan(step), amount, rounded)
+    return grouped[[ingredient_col, amount_col, unit_col]]
+
 category_keywords = {
     "Protein": ["KIP", "RUND", "VARKEN","SEITAN", "VIS", "EI", "TOFU", "LINZEN", "BONEN", "KALKOEN", "ZALM", "SCAMPI","MISO"],
     "Vegetable": ["EDAMAME","LENTEUI","KERSTOMATEN","AUBERGINE","COURGETTE","CHAMPIGNONS","BROCCOLI", "SPINAZIE", "WORTEL", "TOMAAT", "AARDAPPEL", "UI", "PAPRIKA", "KOMKOMMER", "SPITSKKOOL", "BLOEMKOOL"],
@@ -258,19 +662,87 @@ seasonal_ingredients = {
     "12": ["APPEL","WORTEL","RODEUI","PREI","MANDARIJN"]
 }
 
+# KEYWORD CLASSIFIER
+# Aho-Corasick automaton over all keywords of a {category: [keywords]} dict, so an ingredient is scanned once
+# instead of once per keyword. The result is the first category (in dict order) that has a keyword in the text,
+# exactly like the previous any(keyword in ...) loops. Results are memoized per ingredient.
+class KeywordClassifier:
+    def __init__(self, keywords_per_category, default="Other"):
+        self.categories = list(keywords_per_category)
+        self.default = default
+        self.memo = {}
+        no_match = len(self.categories)
+
+        # Trie of all keywords, every node keeps the best (lowest) category priority ending there
+        self.goto = [{}]
+        self.best = [no_match]
+        for priority, keywords in enumerate(keywords_per_category.values()):
+            for keyword in keywords:
+                node = 0
+                for ch in keyword:
+                    if ch not in self.goto[node]:
+                        self.goto.append({})
+                        self.best.append(no_match)
+                        self.goto[node][ch] = len(self.goto) - 1
+                    node = self.goto[node][ch]
+                self.best[node] = min(self.best[node], priority)
+
+        # Failure links (breadth first, depth 1 nodes fail to the root), a node also matches everything its failure node matches
+        self.fail = [0] * len(self.goto)
+        queue = list(self.goto[0].values())
+        for node in queue:
+            for ch, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.best[child] = min(self.best[child], self.best[self.fail[child]])
+                queue.append(child)
+
+    def classify(self, text):
+        if not isinstance(text, str):
+            return self.default
+        text_upper = text.upper()
+        if text_upper in self.memo:
+            return self.memo[text_upper]
+        goto, fail, best = self.goto, self.fail, self.best
+        node = 0
+        found = len(self.categories)
+        for ch in text_upper:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if best[node] < found:
+                found = best[node]
+                if found == 0:
+                    break
+        result = self.categories[found] if found < len(self.categories) else self.default
+        self.memo[text_upper] = result
+        return result
+
+    def classifySeries(self, series):
+        # Classify each unique value once, then map back
+        codes, uniques = pd.factorize(series)
+        labels = np.array([self.classify(value) for value in uniques] + [self.default], dtype=object)
+        return pd.Series(labels[codes], index=series.index, name=series.name)
+
+category_classifier = KeywordClassifier(category_keywords)
+veggie_classifier = KeywordClassifier(veggie_keywords)
+
+def rebuild_classifiers():
+    # Call after changing category_keywords or veggie_keywords
+    global category_classifier, veggie_classifier
+    category_classifier = KeywordClassifier(category_keywords)
+    veggie_classifier = KeywordClassifier(veggie_keywords)
+
 def categorize_ingredient(ingredient):
-    ingredient_upper = ingredient.upper()
-    for category, keywords in category_keywords.items():
-        if any(keyword in ingredient_upper for keyword in keywords):
-            return category
-    return "Other"
+    return category_classifier.classify(ingredient)
+
+def categorize_series(series):
+    return category_classifier.classifySeries(series)
  
 def is_veggie_ingredient(ingredient):
-    ingredient_upper = ingredient.upper()
-    for category, keywords in veggie_keywords.items():
-        if any(keyword in ingredient_upper for keyword in keywords):
-            return category
-    return "Other"
+    return veggie_classifier.classify(ingredient)
 
 
 def is_veggie_recipe(recipe_name):
@@ -284,35 +756,513 @@ def is_veggie_recipe(recipe_name):
 
 
 
+# RECIPE ATTRIBUTE INDEX
+# One row per recipe with everything the sidebar suggestions sort or filter on, built once after a (re)load.
+# The first TOP_K_CACHE recipes per column are kept in order, so "top 5" questions are answered without a sort.
+class RecipeAttributeIndex:
+    TOP_K_CACHE = 25
+    SORTABLE_COLUMNS = ["UniqueIngredients", "KcalPortion", "ProtPer100Kcal"] + [f"Season_{month}" for month in range(1, 13)]
+
+    def __init__(self, recipes, nutrition):
+        self.recipes = recipes      # the RecipeDict and RecipeNutritionIndex the table is built from
+        self.nutrition = nutrition
+        self.lock = threading.Lock()
+        self.stale = True
+        self.table = pd.DataFrame()
+        self.topCache = {}      # (column, largest) => [(recipe key, value), ...]
+        self.veggieKeys = []
+
+    def build(self):
+        # An invalidation while building marks the index stale again
+        self.stale = False
+        seasonal_sets = {month: set(seasonal_ingredients.get(str(month), [])) for month in range(1, 13)}
+        rows = []
+        for recipe_key, recipe in self.recipes.items():
+            ingredient_keys = list(dict.fromkeys(makeKey(ingredient) for ingredient in recipe.ingredientsRecipe))
+            categories = {veggie_classifier.classify(ingredient) for ingredient in recipe.ingredientsRecipe}
+            veggie_type = "Meat" if "Meat" in categories else "Fish" if "Fish" in categories else "Veggie"
+            kcal, _, protPer100Kcal = self.nutrition.get(recipe_key)
+            row = {
+                "RecipeKey": recipe_key,
+                "RecipeLabel": recipe.getLabel(),
+                "VeggieType": veggie_type,
+                "UniqueIngredients": len(ingredient_keys),
+                "KcalPortion": kcal,
+                "ProtPer100Kcal": protPer100Kcal,
+            }
+            for month, seasonal in seasonal_sets.items():
+                row[f"Season_{month}"] = sum(key in seasonal for key in ingredient_keys) / len(ingredient_keys) if ingredient_keys else 0.0
+            rows.append(row)
+        table = pd.DataFrame(rows, columns=["RecipeKey", "RecipeLabel", "VeggieType"] + self.SORTABLE_COLUMNS)
+        veggieKeys = table.loc[table["VeggieType"] == "Veggie", "RecipeKey"].tolist()
+
+        # heapq.nsmallest is stable, so ties keep the RecipeDict order (same as sorted(...)[:k])
+        topCache = {}
+        for col in self.SORTABLE_COLUMNS:
+            items = list(zip(table["RecipeKey"], table[col]))
+            topCache[(col, False)] = heapq.nsmallest(self.TOP_K_CACHE, items, key=lambda item: item[1])
+            topCache[(col, True)] = heapq.nsmallest(self.TOP_K_CACHE, items, key=lambda item: -item[1])
+        # Published with one dict update, a reader never combines a new table with an old topCache
+        vars(self).update(table=table, veggieKeys=veggieKeys, topCache=topCache)
+
+    def refresh(self):
+        if self.stale:
+            with self.lock:
+                if self.stale:
+                    self.build()
+
+    def topK(self, column, k=5, largest=False, veggie_only=False):
+        self.refresh()
+        if k <= self.TOP_K_CACHE and not veggie_only:
+            return self.topCache[(column, largest)][:k]
+        table = self.table
+        if veggie_only:
+            table = table[table["VeggieType"] == "Veggie"]
+        items = zip(table["RecipeKey"], table[column])
+        return heapq.nsmallest(k, items, key=(lambda item: -item[1]) if largest else (lambda item: item[1]))
+
+    def veggieRecipes(self):
+        self.refresh()
+        return self.veggieKeys
+
+RecipeAttributes = RecipeAttributeIndex(RecipeDict, RecipeNutrition)
+
+def get_recipe_attributes():
+    """DataFrame with VeggieType, UniqueIngredients, KcalPortion, ProtPer100Kcal and Season_1..12 per recipe"""
+    RecipeAttributes.refresh()
+    return RecipeAttributes.table
+
+def recipe_top_k(column, k=5, largest=False, veggie_only=False):
+    """[(recipe key, value), ...] for the k recipes with the lowest (or largest) value in column"""
+    return RecipeAttributes.topK(column, k, largest, veggie_only)
+
+def get_veggie_recipes():
+    return RecipeAttributes.veggieRecipes()
+
+
+# RECIPE x INGREDIENT MATRIX
+# Every ingredient line of every recipe for 1 portion, stored as COO arrays (recipe row, item column, amount) with the
+# lines of a recipe next to each other. An item is an (ingredient label, unit) pair, the grouping of the combined list.
+# Amounts for a selection of {recipe: portion} are a sparse matrix-vector product: np.bincount over the item column
+# with amount * portion as weights.
+class RecipeIngredientMatrix:
+    def __init__(self, recipes, ingredients):
+        self.recipes = recipes          # the RecipeDict and IngredientDict the matrix is built from
+        self.ingredients = ingredients
+        self.lock = threading.Lock()
+        self.stale = True
+
+    def build(self):
+        # An invalidation while building marks the matrix stale again
+        self.stale = False
+        recipe_rows, names, amounts, units = [], [], [], []
+        for row, recipe in enumerate(self.recipes.values()):
+            for ingredient, values in recipe.ingredientsRecipe.items():
+                recipe_rows.append(row)
+                names.append(ingredient)
+                amounts.append(values.get('amount', 0))
+                units.append(values.get('unit', ""))
+        recipeKeys = list(self.recipes.keys())
+        lineRecipe = np.asarray(recipe_rows, dtype=np.int64)
+
+        # Names and units are normalized per unique value, recipes share most of their ingredients
+        lineIngredient, ingredientNames = pd.factorize(pd.Series(names, dtype=object))
+        ingredientNames = pd.Index(ingredientNames).astype(object)
+        ingredientKeys = ingredientNames.str.replace(" ", "", regex=False).str.upper()
+        rows = self.ingredients.rows(ingredientKeys)
+        ingredientLabels = np.array(
+            [self.ingredients.names[row] if row >= 0 else name for row, name in zip(rows, ingredientNames)], dtype=object)
+        unit_codes, unit_names = pd.factorize(pd.Series(units, dtype=object))
+        lineUnitNorm = pd.Index(unit_names).astype(str).str.strip().str.lower().to_numpy(dtype=object)[unit_codes]
+
+        # Item columns: distinct (label, normalized unit) pairs
+        items = pd.DataFrame({"Ingredient": ingredientLabels[lineIngredient], "Unit": lineUnitNorm})
+        lineItem, item_index = pd.MultiIndex.from_frame(items).factorize()
+
+        # Published with one dict update, a reader never combines arrays of two builds
+        vars(self).update(
+            recipeKeys=recipeKeys,
+            recipeRow={key: row for row, key in enumerate(recipeKeys)},
+            lineRecipe=lineRecipe,
+            recipeStart=np.searchsorted(lineRecipe, np.arange(len(recipeKeys) + 1)),
+            lineAmount=pd.to_numeric(pd.Series(amounts, dtype=object), errors='coerce').to_numpy(dtype=float),
+            lineUnit=np.asarray(units, dtype=object),
+            lineIngredient=lineIngredient,
+            ingredientNames=ingredientNames,
+            ingredientKeys=ingredientKeys,
+            ingredientLabels=ingredientLabels,
+            lineUnitNorm=lineUnitNorm,
+            lineItem=lineItem,
+            itemLabel=item_index.get_level_values(0).to_numpy(dtype=object),
+            itemUnit=item_index.get_level_values(1).to_numpy(dtype=object),
+        )
+
+    def refresh(self):
+        if self.stale:
+            with self.lock:
+                if self.stale:
+                    self.build()
+
+    def selectLines(self, selection):
+        # Line numbers and portion per line for {recipe key: portion}, in selection order
+        rows = np.array([self.recipeRow[key] for key in selection], dtype=np.int64)
+        portions = np.array(list(selection.values()), dtype=float)
+        counts = self.recipeStart[rows + 1] - self.recipeStart[rows]
+        offsets = np.repeat(self.recipeStart[rows] - np.cumsum(counts) + counts, counts)
+        lines = np.arange(counts.sum()) + offsets
+        return lines, np.repeat(portions, counts), counts
+
+    def aggregate(self, selection, extras=None, notes=None, normalize=False):
+        self.refresh()
+        selection = {makeKey(key): portion for key, portion in selection.items()}
+        unknown = [key for key in selection if key not in self.recipeRow]
+        if unknown:
+            raise KeyError(f"Recipes not found in RecipeDict: {', '.join(unknown)}")
+        notes = notes or {}
+        lines, line_portion, counts = self.selectLines(selection)
+
+        # Per recipe rows, same columns as the Per Recipe export sheet
+        amounts = self.lineAmount[lines] * line_portion
+        ingredient = self.lineIngredient[lines]
+        per_recipe = pd.DataFrame({
+            "Recipe": np.repeat(np.array([key.ljust(12) for key in selection], dtype=object), counts),
+            "Portion": np.repeat(np.array(list(selection.values()), dtype=object), counts),
+            "Ingredient": self.ingredientLabels[ingredient],
+            "IngredientKey": np.asarray(self.ingredientKeys, dtype=object)[ingredient],
+            "Amount": amounts,
+            "Unit": self.lineUnit[lines],
+            "Notes": np.repeat(np.array([notes.get(key, "") for key in selection], dtype=object), counts),
+        })
+        ends = np.cumsum(counts)
+        recipe_slices = {key: slice(end - count, end) for key, count, end in zip(selection, counts, ends)}
+
+        # Combined list: sparse product over the items of the selected lines, then the extras on top
+        n_items = len(self.itemLabel)
+        item_amount = np.bincount(self.lineItem[lines], weights=np.nan_to_num(amounts), minlength=n_items)
+        item_used = np.bincount(self.lineItem[lines], minlength=n_items) > 0
+        combined = pd.DataFrame({"Ingredient": self.itemLabel[item_used], "Unit": self.itemUnit[item_used],
+                                 "Amount": item_amount[item_used]})
+        if extras:
+            combined = pd.concat([combined, pd.DataFrame(extras)[["Ingredient", "Unit", "Amount"]]], ignore_index=True)
+            combined = combined.groupby(["Ingredient", "Unit"], as_index=False, sort=False)["Amount"].sum()
+        combined = combined.sort_values(["Ingredient", "Unit"], ignore_index=True)[["Ingredient", "Amount", "Unit"]]
+        if not normalize:
+            return GroceryList(per_recipe, combined, recipe_slices)
+
+        # Normalized: the ungrouped rows (recipe lines and extras) are converted before they are grouped
+        rows = pd.DataFrame({"Ingredient": self.ingredientLabels[ingredient], "Unit": self.lineUnitNorm[lines], "Amount": amounts})
+        if extras:
+            rows = pd.concat([rows, pd.DataFrame(extras)[["Ingredient", "Unit", "Amount"]]], ignore_index=True)
+        normalized = normalize_units(rows).sort_values(["Ingredient", "Unit"], ignore_index=True)
+        return GroceryList(per_recipe, normalized, recipe_slices, combined_by_unit=combined)
+
+class GroceryList:
+    """Result of aggregate_grocery_list: the Per Recipe rows and the Combined list (Ingredient, Amount, Unit).
+    combined_by_unit is the list grouped per (ingredient, unit) without normalization, the form the log expects."""
+    def __init__(self, per_recipe, combined, recipeSlices, combined_by_unit=None):
+        self.per_recipe = per_recipe
+        self.combined = combined
+        self.combined_by_unit = combined if combined_by_unit is None else combined_by_unit
+        self.recipeSlices = recipeSlices
+
+    def rowsMerged(self):
+        # Lines saved by normalizing the units (0 when not normalized)
+        return len(self.combined_by_unit) - len(self.combined)
+
+    def forRecipe(self, name):
+        # Rows of one recipe (Ingredient, Amount, Unit)
+        return self.per_recipe.iloc[self.recipeSlices[makeKey(name)]][["Ingredient", "Amount", "Unit"]]
+
+RecipeMatrix = RecipeIngredientMatrix(RecipeDict, IngredientDict)
+
+def aggregate_grocery_list(selection, extras=None, notes=None, normalize=False):
+    """Grocery list for {recipe key: portion} plus extra rows ({'Ingredient', 'IngredientKey', 'Unit', 'Amount'}).
+    notes: {recipe key: note} for the Notes column of the Per Recipe rows.
+    normalize=True merges the g and u lines of an ingredient in the Combined list (see normalize_units)."""
+    return RecipeMatrix.aggregate(selection, extras, notes, normalize)
+
+# SEASON RANKING
+# Recipes scored on the weighted share of in-season ingredients: grams of in-season ingredients / grams of all
+# ingredients for 1 portion. The lines of the recipe x ingredient matrix are crossed with an ingredient x month
+# table of seasonal_ingredients, so all 12 months are scored with one np.bincount. The ranking
+# of every month is sorted once at build time, a top-k query is a slice.
+class SeasonRanking:
+    def __init__(self, matrix, ingredients):
+        self.matrix = matrix            # the RecipeIngredientMatrix and IngredientDict the scores are computed from
+        self.ingredients = ingredients
+        self.lock = threading.Lock()
+        self.stale = True
+        self.state = (np.zeros((0, 12)), np.array([], dtype=object), {})   # scores, recipeKeys, order
+
+    def build(self):
+        # An invalidation while building marks the ranking stale again
+        self.stale = False
+        matrix = self.matrix
+        matrix.refresh()
+        n_recipes = len(matrix.recipeKeys)
+        recipe_rows = matrix.lineRecipe
+        amount = matrix.lineAmount
+        unit = matrix.lineUnitNorm
+        ingredient_codes, ingredient_names = matrix.lineIngredient, matrix.ingredientNames
+
+        # Grams per line, lines that cannot be weighed (unknown unit or gramPerUnit) do not count
+        gram_per_unit = get_gram_per_unit(pd.Series(ingredient_names), self.ingredients)[ingredient_codes]
+        grams = np.where(unit == "u", amount * gram_per_unit, np.where(unit == "g", amount, np.nan))
+        grams = np.nan_to_num(grams, nan=0.0).clip(min=0.0)
+
+        # Ingredient x month table, the extra last row (all False) is used for ingredients that are never in season
+        season_keys = pd.Index(sorted({key for keys in seasonal_ingredients.values() for key in keys}))
+        in_season = np.zeros((len(season_keys) + 1, 12), dtype=bool)
+        for month, keys in seasonal_ingredients.items():
+            in_season[season_keys.get_indexer(keys), int(month) - 1] = True
+        ingredient_rows = season_keys.get_indexer(matrix.ingredientKeys)
+        ingredient_rows[ingredient_rows < 0] = len(season_keys)
+        ingredient_rows = ingredient_rows[ingredient_codes]
+
+        cells = (recipe_rows[:, None] * 12 + np.arange(12)).ravel()
+        seasonal_grams = np.bincount(cells, weights=(in_season[ingredient_rows] * grams[:, None]).ravel(),
+                                     minlength=n_recipes * 12).reshape(n_recipes, 12)
+        total_grams = np.bincount(recipe_rows, weights=grams, minlength=n_recipes)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = np.where(total_grams[:, None] > 0, seasonal_grams / total_grams[:, None], 0.0)
+
+        # Stable sort: recipes with the same score keep the RecipeDict order.
+        # scores, recipeKeys and order are published together (one state tuple), a reader never mixes two builds
+        order = {month: np.argsort(-scores[:, month - 1], kind='stable') for month in range(1, 13)}
+        self.state = (scores, np.array(matrix.recipeKeys, dtype=object), order)
+
+    scores = property(lambda self: self.state[0])
+    recipeKeys = property(lambda self: self.state[1])
+    order = property(lambda self: self.state[2])     # month => recipe rows, best score first
+
+    def refresh(self):
+        if self.stale:
+            with self.lock:
+                if self.stale:
+                    self.build()
+
+    def topK(self, month, k=5, min_score=0.0):
+        self.refresh()
+        scores, recipeKeys, order = self.state
+        rows = order[int(month)][:k]
+        scores = scores[rows, int(month) - 1]
+        keep = scores > min_score
+        return list(zip(recipeKeys[rows][keep].tolist(), scores[keep].tolist()))
+
+    def toDataFrame(self):
+        self.refresh()
+        scores, recipeKeys, _ = self.state
+        df = pd.DataFrame(scores, columns=[f"SeasonScore_{month}" for month in range(1, 13)])
+        df.insert(0, "RecipeKey", recipeKeys)
+        return df
+
+RecipeSeasons = SeasonRanking(RecipeMatrix, IngredientDict)
+
+def recipe_season_top_k(month, k=5, min_score=0.0):
+    """[(recipe key, score), ...] for the k recipes with the largest in-season share (by weight) in month (1-12).
+    Recipes scoring min_score or less are left out."""
+    return RecipeSeasons.topK(month, k, min_score)
+
+def get_recipe_season_scores():
+    return RecipeSeasons.toDataFrame()
+
 #ADD DATA
+def get_column(df, col, default=''):
+    # Column as a list, or the default for every row when the sheet does not have it
+    if col in df.columns:
+        return df[col].tolist()
+    return [default] * len(df)
+
+def build_ingredient_table(df):
+    # Bulk path: same result as calling Ingredient(...) per row, but built from column arrays in one pass
+    table = IngredientTable()
+    names = df['name'].tolist()
+    keys = [makeKey(name) for name in names]
+    gram_arr = df['gramPerUnit'].to_numpy(dtype=float)
+    kcal_arr = np.asarray(get_column(df, 'kcal_100g'), dtype=float)
+    prot_arr = np.asarray(get_column(df, 'prot_100g'), dtype=float)
+    urls = get_column(df, 'url')
+    priceurls = get_column(df, 'priceurl')
+
+    # Only add ingredients that do not already exist, then append all columns at once
+    accepted = []
+    seen = set()
+    for i, name_key in enumerate(keys):
+        if name_key in seen:
+            print(f'Ingredient {names[i]} already exists')
+            continue
+        seen.add(name_key)
+        accepted.append(i)
+
+    table.extend([keys[i] for i in accepted], [names[i] for i in accepted],
+                 [urls[i] for i in accepted], [priceurls[i] for i in accepted],
+                 gram_arr[accepted], kcal_arr[accepted], prot_arr[accepted])
+    return table
+
+def load_ingredients_from_df(df):
+    with data_load_lock:
+        publish_data(build_ingredient_table(df), RecipeDict, build=False)
+
+def build_recipe_dict(df, ingredients):
+    # Bulk path: one pass over the recipe lines instead of groupby + iterrows per group.
+    # ingredients: the IngredientTable the recipes are checked against
+    recipe_dict = {}
+    df = df.dropna(subset=['recipe_name'])
+    rows = {}
+    for recipe_name, ingredient, amount, unit in zip(df['recipe_name'].tolist(), df['ingredient'].tolist(),
+                                                     df['amount'].tolist(), df['unit'].tolist()):
+        rows.setdefault(recipe_name, []).append((ingredient, amount, unit))
+
+    # Same order as groupby('recipe_name'), same checks and messages as Recipe(...)
+    for recipe_name in sorted(rows):
+        Recipe.from_rows(recipe_name, rows[recipe_name], ingredients, recipe_dict)
+    return recipe_dict
+
+def load_recipes_from_df(df):
+    with data_load_lock:
+        publish_data(IngredientDict, build_recipe_dict(df, IngredientDict), build=False)
+
 def load_ingredients_from_excel(filepath):
-    IngredientDict.clear()
-    df = pd.read_excel(filepath,sheet_name='Ingredients')
-    for x, row in df.iterrows():
-        name=row['name']
-        gramPerUnit=row['gramPerUnit']
-        url=row.get('url','')
-        kcal_100g=row.get('kcal_100g','') 
-        prot_100g=row.get('prot_100g','')
-        priceurl=row.get('priceurl','')
-        Ingredient(name, gramPerUnit,url,kcal_100g,prot_100g,priceurl)
+    load_ingredients_from_df(pd.read_excel(filepath,sheet_name='Ingredients'))
 
 def load_recipes_from_excel(filepath):
-    RecipeDict.clear()
-    df = pd.read_excel(filepath, sheet_name='Recipes')
-    grouped = df.groupby('recipe_name')
-
-    for recipe_name, group in grouped:
-        ingredientsRecipe = {}
-        for _, row in group.iterrows():
-            ingredient = row['ingredient']
-            amount = row['amount']
-            unit = row['unit']
-            ingredientsRecipe[ingredient] = {'amount': amount, 'unit': unit}
-        Recipe(recipe_name, ingredientsRecipe)
-
-def load_data_from_excel(filepath):
-    load_ingredients_from_excel(filepath)
-    load_recipes_from_excel(filepath)
+    load_recipes_from_df(pd.read_excel(filepath, sheet_name='Recipes'))
+
+
+# SNAPSHOT CACHE
+# Parsed Ingredients/Recipes sheets are pickled next to the workbook so a rerun doesn't have to go through openpyxl.
+# The snapshot is keyed by mtime/size (cheap check) and the sha256 of the workbook (touched but unchanged file).
+SNAPSHOT_VERSION = 1
+
+def get_snapshot_path(filepath):
+    folder, filename = os.path.split(os.path.abspath(filepath))
+    return os.path.join(folder, '.cache', f'{filename}.snapshot.pkl')
+
+def file_sha256(filepath):
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def read_sheets_from_excel(filepath):
+    sheets = pd.read_excel(filepath, sheet_name=['Ingredients', 'Recipes'])
+    return sheets['Ingredients'], sheets['Recipes']
+
+def write_snapshot(filepath, df_ingredients, df_recipes, sha256=None):
+    stat = os.stat(filepath)
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+        'sha256': sha256 or file_sha256(filepath),
+        'ingredients': {col: df_ingredients[col].to_numpy() for col in df_ingredients.columns},
+        'recipes': {col: df_recipes[col].to_numpy() for col in df_recipes.columns},
+    }
+    snapshot_path = get_snapshot_path(filepath)
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    # Write to a temp file first so a concurrent reader never sees a half written snapshot
+    tmp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot
+
+def read_snapshot(filepath):
+    snapshot_path = get_snapshot_path(filepath)
+    try:
+        with open(snapshot_path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        # Missing, corrupt or written by an incompatible version => rebuild from Excel
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    return snapshot
+
+def read_data_sheets(filepath, use_snapshot=True):
+    """Return (df_ingredients, df_recipes), from the snapshot if data.xlsx did not change."""
+    if not use_snapshot:
+        return read_sheets_from_excel(filepath)
+
+    stat = os.stat(filepath)
+    snapshot = read_snapshot(filepath)
+    if snapshot and (snapshot['mtime_ns'], snapshot['size']) != (stat.st_mtime_ns, stat.st_size):
+        # mtime changed: only rebuild if the content changed as well
+        sha256 = file_sha256(filepath)
+        if snapshot['sha256'] == sha256:
+            df_ingredients = pd.DataFrame(snapshot['ingredients'])
+            df_recipes = pd.DataFrame(snapshot['recipes'])
+            try:
+                write_snapshot(filepath, df_ingredients, df_recipes, sha256)
+            except OSError as e:
+                print(f'Warning: could not refresh snapshot for {filepath}: {e}')
+            return df_ingredients, df_recipes
+        snapshot = None
+
+    if snapshot:
+        return pd.DataFrame(snapshot['ingredients']), pd.DataFrame(snapshot['recipes'])
+
+    df_ingredients, df_recipes = read_sheets_from_excel(filepath)
+    try:
+        write_snapshot(filepath, df_ingredients, df_recipes)
+    except OSError as e:
+        # Read-only deploy: keep working from Excel
+        print(f'Warning: could not write snapshot for {filepath}: {e}')
+    return df_ingredients, df_recipes
+
+# Signature (mtime_ns, size) of the data file the current IngredientDict/RecipeDict were loaded from.
+# Kept here rather than in the app's SharedCache: an evicted cache entry must not trigger a reload.
+loaded_data_signature = {}   # filepath => signature
+data_load_lock = threading.RLock()
+
+# The loaded data as one immutable snapshot: the two dicts and the recipe indexes built from them.
+# A (re)load builds a complete new snapshot and publishes it with one assignment, the module globals
+# (IngredientDict, RecipeDict, RecipeNutrition, ...) are rebound to it right after for the existing callers.
+# Code that may run during a reload by another thread (an app rerun) takes LoadedData once and uses only its fields.
+DataSnapshot = namedtuple("DataSnapshot", "ingredients recipes nutrition matrix attributes seasons")
+LoadedData = DataSnapshot(IngredientDict, RecipeDict, RecipeNutrition, RecipeMatrix, RecipeAttributes, RecipeSeasons)
+
+def publish_data(ingredients, recipes, build=True):
+    # Call with data_load_lock held. build=False leaves the indexes to be built on first use.
+    global LoadedData, IngredientDict, RecipeDict, RecipeNutrition, RecipeMatrix, RecipeAttributes, RecipeSeasons
+    nutrition = RecipeNutritionIndex(recipes, ingredients)
+    matrix = RecipeIngredientMatrix(recipes, ingredients)
+    attributes = RecipeAttributeIndex(recipes, nutrition)
+    seasons = SeasonRanking(matrix, ingredients)
+    if build:
+        for index in (nutrition, matrix, attributes, seasons):
+            index.refresh()
+    LoadedData = DataSnapshot(ingredients, recipes, nutrition, matrix, attributes, seasons)
+    IngredientDict, RecipeDict, RecipeNutrition, RecipeMatrix, RecipeAttributes, RecipeSeasons = LoadedData
+
+def data_signature(filepath):
+    stat = os.stat(filepath)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load_data_from_excel(filepath, use_snapshot=True):
+    with data_load_lock:
+        signature = data_signature(filepath)
+        df_ingredients, df_recipes = read_data_sheets(filepath, use_snapshot)
+        # The dicts and every index are built aside and published together (see publish_data): a rerun of another
+        # session that took the previous LoadedData keeps reading a complete old version, dicts and indexes alike.
+        # The indexes are built now instead of on the first rerun that needs them.
+        ingredients = build_ingredient_table(df_ingredients)
+        recipes = build_recipe_dict(df_recipes, ingredients)
+        publish_data(ingredients, recipes)
+        loaded_data_signature[filepath] = signature
+
+def reload_data_if_changed(filepath):
+    """Reload Ingredients and Recipes when the data file changed since it was loaded. Returns True if it reloaded.
+    Safe to call from every rerun of every session: only one thread reloads, the others keep the current data."""
+    signature = data_signature(filepath)
+    if loaded_data_signature.get(filepath) == signature:
+        return False
+    with data_load_lock:
+        if loaded_data_signature.get(filepath) == data_signature(filepath):
+            return False
+        load_data_from_excel(filepath)
+    return True
  
-load_data_from_excel("./Excel_files/data.xlsx") #Grocery_list\Excel_files\data.xlsx
+data_file_path = "./Excel_files/data.xlsx" #Grocery_list\Excel_files\data.xlsx
+load_data_from_excel(data_file_path)
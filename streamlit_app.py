@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import os
 import io
+import time
 from main import *  # RecipeDict, IngredientDict, get
 from datetime import date, datetime
 import altair as alt
@@ -12,11 +13,17 @@ from collections import Counter
 import random
 from Colruyt_scraping.colruyt_scraper_price import *
 import uuid
+from app_cache import SharedCache, file_signature
+from export_worker import ExportWorker, content_hash
+from xlsx_writer import write_xlsx, dataframe_rows
+from log_store import (ensure_log_store, read_log_frame, read_log_dates, append_export, export_log_to_excel,
+                       read_favorite_recipes, read_last_extras)
 
 # CMD run locally: streamlit run streamlit_app.py
 
 # --- Configure page layout ---
 st.set_page_config(layout='wide', initial_sidebar_state='expanded')
+script_start = time.perf_counter()
 col_seq = ["Ingredient", "Amount", "Unit"]
 # --- Navigation ---
 page = st.radio("Navigation", 
@@ -25,53 +32,91 @@ page = st.radio("Navigation",
 current_month = str(datetime.now().month)
 seasonal_this_month = set(seasonal_ingredients.get(current_month, []))
  
-# LOAD DATA FROM LOG FILE
-log_file_path = "./Excel_files/Log/Grocery_List_Log.xlsx"
+# SHARED CACHE
+# One cache per server process, shared by all sessions. Values are keyed on file signatures (and filters), never modify them.
+@st.cache_resource
+def get_shared_cache():
+    return SharedCache(max_entries=64, max_bytes=512 * 1024 * 1024, ttl=3600)
+
+shared_cache = get_shared_cache()
+
+# EXPORT WORKER
+# Writing the export and the log happens on a background thread, shared by all sessions
+@st.cache_resource
+def get_export_worker():
+    return ExportWorker(debounce=2.0, max_pending=8)
+
+export_worker = get_export_worker()
+
+def build_export_workbook(combined, per_recipe_df):
+    # Combined and Per Recipe sheets as xlsx bytes, streamed in write_only mode
+    sheets = [(sheet_name, list(df.columns), dataframe_rows(df))
+              for sheet_name, df in [("Combined", combined), ("Per Recipe", per_recipe_df)] if not df.empty]
+    if not sheets:
+        sheets = [("Info", ["Message"], [("No data to export",)])]
+    buffer = io.BytesIO()
+    write_xlsx(buffer, sheets)
+    return buffer.getvalue()
+
+def show_export_status(status):
+    if status is None:
+        return
+    saved = (f"Last saved at {datetime.fromtimestamp(status['last_write']):%H:%M:%S}, {status['writes']} write(s), "
+             f"{status['skipped']} unchanged skipped") if status["last_write"] else "Not saved yet"
+    if status["state"] == "failed":
+        st.sidebar.error("Saving the list failed, see the server log.")
+    elif status["state"] in ("pending", "running"):
+        st.sidebar.caption(f"💾 Saving the list ({status['state']})... {saved}")
+    else:
+        st.sidebar.caption(f"💾 {saved}")
 
-if not os.path.exists(log_file_path):
-    st.warning("Log file not found. No data to analyze yet.")
-else:
-    # Load data
-    df_log_per_recipe = pd.read_excel(log_file_path, sheet_name="Log Per Recipe")
-    df_log_combined = pd.read_excel(log_file_path, sheet_name="Log Combined")
-    
-    # Ensure ExportDate is in date format
-    df_log_per_recipe["ExportDate"] = pd.to_datetime(df_log_per_recipe["ExportDate"])
-    df_log_combined["ExportDate"] = pd.to_datetime(df_log_combined["ExportDate"])
-    
-    # Get dataframes containing : Unique Recipes / ExportDate => Sum of portions over all ExportDates  &  how many times recipe was logged => Favorite recipes
-    df_uniq_recipe_per_date = df_log_per_recipe.drop_duplicates(subset=["Recipe", "ExportDate", "Portion"]).reset_index(drop=True)
-    df_sum_portion_per_recipe = df_uniq_recipe_per_date.groupby("Recipe", as_index=False)["Portion"].sum().sort_values(by="Recipe")
-    df_freq_recipe = df_log_per_recipe.groupby("Recipe", as_index=False)["ExportDate"].nunique().rename(columns={"ExportDate":"Frequency"})
-
-    df_fav_recipes = df_sum_portion_per_recipe.merge(df_freq_recipe, on="Recipe")
-    df_fav_recipes['AvgPortion'] = df_fav_recipes['Portion'] / df_fav_recipes['Frequency']
-    df_fav_recipes = df_fav_recipes.sort_values(by='AvgPortion',ascending=False).head(5)
-
-    # Get dataframe for last log
-    last_log_date = df_log_combined["ExportDate"].max()
-    df_last_log_combined = df_log_combined[df_log_combined["ExportDate"] == last_log_date].copy()
-    df_last_log_per_recipe = df_log_per_recipe[df_log_per_recipe["ExportDate"] == last_log_date].copy()
-
-    # Get dataframe where ingredients are grouped => Difference between combined and per recipe
-    df_last_log_combined_grouped = df_last_log_combined.groupby(["Ingredient", "Unit"], as_index=False)["Amount"].sum()
-    df_last_log_per_recipe_grouped = df_last_log_per_recipe.groupby(["Ingredient", "Unit"], as_index=False)["Amount"].sum()
-    
-    # Get dataframe only with the ingredients that were logged as an extra ingredient, not in a recipe last time
-    df_extras_only = pd.merge(
-                df_last_log_combined_grouped,
-                df_last_log_per_recipe_grouped,
-                on=["Ingredient", "Unit"],
-                how="left",
-                suffixes=("_combined", "_recipe"))
-
-    df_extras_only["Amount_recipe"] = df_extras_only["Amount_recipe"].fillna(0)
-    df_extras_only["Amount"] = df_extras_only["Amount_combined"] - df_extras_only["Amount_recipe"]
-    df_extras_only = df_extras_only[df_extras_only["Amount"] > 0][["Ingredient", "Unit", "Amount"]]
-    
-    # Get dataframes of all data except today
-    all_prev_per_recipe_log = df_log_per_recipe[df_log_per_recipe['ExportDate'] != today]
-    all_prev_combined_log = df_log_combined[df_log_combined['ExportDate'] != today]
+# Reload Ingredients and Recipes when data.xlsx changed since the last load (from the snapshot when possible).
+# A reload publishes a new LoadedData (dicts and recipe indexes). This rerun takes the current one once and only uses
+# its fields, so a reload by another session halfway through the rerun cannot mix old dicts with new indexes.
+reload_data_if_changed(data_file_path)
+from main import LoadedData as loaded_data
+IngredientDict, RecipeDict = loaded_data.ingredients, loaded_data.recipes
+
+# LOAD DATA FROM LOG FILE
+# The log is an append-only SQLite store, the Excel log is only imported once (and can be downloaded on demand)
+log_file_path = "./Excel_files/Log/Grocery_List_Log.sqlite"
+excel_log_file_path = "./Excel_files/Log/Grocery_List_Log.xlsx"
+ensure_log_store(log_file_path, excel_log_file_path)
+
+# LAZY PROVIDERS
+# Nothing is derived from the log at the top of the script: each page asks for the frames it uses.
+# provide() memoizes per rerun (run_frames) and across sessions (shared_cache), and records what each provider cost.
+run_frames = {}
+run_timings = []   # (provider, ms, served from cache) for this rerun
+
+def provide(name, key, build):
+    if name in run_frames:
+        return run_frames[name]
+    built = []
+    def build_and_flag():
+        built.append(True)
+        return build()
+    start = time.perf_counter()
+    value = shared_cache.get_or_compute(key, build_and_flag)
+    run_timings.append((name, (time.perf_counter() - start) * 1000, not built))
+    run_frames[name] = value
+    return value
+
+def get_log_signature():
+    # Labels depend on data.xlsx, so both files are part of the key
+    return file_signature(log_file_path, data_file_path)
+
+def map_categories(series, func):
+    # func runs once per category instead of once per row, the result is categorical with sorted categories
+    mapped = series.map(func)
+    return mapped.astype(pd.CategoricalDtype(sorted(mapped.dropna().unique())))
+
+def build_log_frames(start=None, end=None):
+    # Only the columns used here, with pinned dtypes (categorical strings, float32 amounts, datetime64 dates).
+    # start/end limit the rows that are read from the store
+    df_log_per_recipe = read_log_frame(log_file_path, "Log Per Recipe", start=start, end=end,
+                                       columns=["Recipe", "Portion", "Ingredient", "IngredientKey", "Amount", "Unit", "ExportDate"])
+    df_log_combined = read_log_frame(log_file_path, "Log Combined", start=start, end=end)
 
     # Create Date Columns
     df_log_combined["DateOnly"] = df_log_combined["ExportDate"].dt.date
@@ -84,22 +129,52 @@ else:
     df_log_per_recipe["MonthNum"] = df_log_per_recipe["ExportDate"].dt.month
     df_log_per_recipe["MonthName"] = df_log_per_recipe["ExportDate"].dt.strftime("%b")
 
-    # Global Date Filter used in tab Data Analysis
-    unique_dates = sorted(df_log_combined["DateOnly"].unique(), reverse=True)
-
-    all_years = sorted(df_log_combined["Year"].unique())
-    all_months = sorted(df_log_combined["MonthNum"].unique())
-    all_month_names = df_log_combined.drop_duplicates("MonthNum")[["MonthNum", "MonthName"]].sort_values("MonthNum")["MonthName"].tolist()
-    all_dates = sorted(df_log_combined["DateOnly"].unique())
-    
-    # Get RecipeLabel & IngredientLabel (first normalize key)
+    # Get RecipeLabel & IngredientLabel (first normalize key), per category
     df_log_per_recipe['IngredientLabel'] = df_log_per_recipe['Ingredient']
-    df_log_per_recipe['IngredientKey'] = df_log_per_recipe['IngredientKey'].str.strip().str.upper().str.replace(" ","", regex=False)
-    df_log_per_recipe['RecipeKey'] = df_log_per_recipe['Recipe'].str.strip().str.upper()
-    df_log_per_recipe['RecipeLabel'] = df_log_per_recipe['Recipe'].map(getRecipeLabel)
+    df_log_per_recipe['IngredientKey'] = map_categories(df_log_per_recipe['IngredientKey'], lambda key: key.strip().upper().replace(" ",""))
+    df_log_per_recipe['RecipeKey'] = map_categories(df_log_per_recipe['Recipe'], lambda recipe: recipe.strip().upper())
+    df_log_per_recipe['RecipeLabel'] = map_categories(df_log_per_recipe['Recipe'], getRecipeLabel)
     
-    df_log_combined['IngredientKey'] = df_log_combined['Ingredient'].str.strip().str.upper().str.replace(" ","", regex=False)
-    df_log_combined['IngredientLabel'] = df_log_combined['Ingredient'].map(lambda r: IngredientDict[r].getLabel() if r in IngredientDict else r)
+    df_log_combined['IngredientKey'] = map_categories(df_log_combined['Ingredient'], lambda ingredient: ingredient.strip().upper().replace(" ",""))
+    df_log_combined['IngredientLabel'] = map_categories(df_log_combined['Ingredient'], lambda r: IngredientDict[r].getLabel() if r in IngredientDict else r)
+
+    return df_log_per_recipe, df_log_combined
+
+def get_log_frames(start=None, end=None):
+    """(df_log_per_recipe, df_log_combined) with the date, key and label columns, between start and end (inclusive)"""
+    name = "log_frames" if start is None and end is None else f"log_frames {start}..{end}"
+    return provide(name, ("log_frames", get_log_signature(), start, end),
+                   lambda: build_log_frames(start, end))
+
+def get_date_options():
+    def build_date_options():
+        # Global Date Filter used in tab Data Analysis, from the export dates only (no log rows are read)
+        all_dates = read_log_dates(log_file_path)
+        month_names = {date.month: date.strftime("%b") for date in all_dates}
+        return {
+            "all_years": sorted({date.year for date in all_dates}),
+            "all_months": sorted(month_names),
+            "all_month_names": [month_names[month] for month in sorted(month_names)],
+            "all_dates": all_dates,
+        }
+    return provide("date_options", ("date_options", get_log_signature()), build_date_options)
+
+def get_ingredient_options():
+    """(label => (key, ingredient), sorted labels) for the extra ingredient rows, rebuilt only when data.xlsx changes"""
+    def build_ingredient_options():
+        options = {ingr_value.getLabel(): (ingr_key, ingr_value) for ingr_key, ingr_value in IngredientDict.items()}
+        return options, sorted(options)
+    return provide("ingredient_options", ("ingredient_options", file_signature(data_file_path)), build_ingredient_options)
+
+# Favorite recipes and the extras of the last export are kept up to date by the log store on each export
+def get_fav_recipes():
+    return provide("fav_recipes", ("fav_recipes", get_log_signature()), lambda: read_favorite_recipes(log_file_path, top_n=5))
+
+def get_last_extras():
+    return provide("last_extras", ("last_extras", get_log_signature()), lambda: read_last_extras(log_file_path))
+
+if not os.path.exists(log_file_path):
+    st.warning("Log file not found. No data to analyze yet.")
 
 
 # --- Initialize session state for recipe selections ---
@@ -113,6 +188,8 @@ if "last_extra_ids" not in st.session_state:
     st.session_state.last_extra_ids = {}
 if "reused_extra_ids" not in st.session_state:
     st.session_state.reused_extra_ids = set()
+if "last_extra_ingredients" not in st.session_state:
+    st.session_state.last_extra_ingredients = {}   # selected label => ingredient, excluded from the extra rows
     
 # For both "pages"
 st.sidebar.title("Settings")
@@ -137,6 +214,7 @@ if page == "Grocery List Maker":
                 st.session_state[f"portion_{rid}"] = int(row["Amount"])
                 st.session_state[f"TypeOfUnit_{rid}"] = row["Unit"]
                 st.session_state.reused_extra_ids.add(rid)
+                st.session_state.last_extra_ingredients[label] = row["Ingredient"]
         # Also remove any rows in extra_rows that correspond to labels no longer selected
         labels_to_remove = [label for label, rid in st.session_state.last_extra_ids.items()
                             if label not in st.session_state.selected_last_extras]
@@ -147,6 +225,7 @@ if page == "Grocery List Maker":
             for key in [f"ing_{rid}", f"portion_{rid}", f"TypeOfUnit_{rid}"]:
                 st.session_state.pop(key, None)
             st.session_state.reused_extra_ids.discard(rid)
+            st.session_state.last_extra_ingredients.pop(label, None)
 
     st.title("Grocery List Maker! A La Esh!")
     with st.expander('Choose recipes and portions'):
@@ -183,10 +262,8 @@ if page == "Grocery List Maker":
 
     selected = st.session_state.selected_recipes
 
-    # Get all available Ingredients from IngredientDict
-    ingredient_options = {
-        ingr_value.getLabel(): (ingr_key, ingr_value)
-        for ingr_key, ingr_value in IngredientDict.items() }
+    # Get all available Ingredients from IngredientDict (label => (key, ingredient)) and their labels sorted
+    ingredient_options, sorted_ingredient_labels = get_ingredient_options()
     
     # Create radiobutton for suggestions
     suggestion_type = st.sidebar.radio("Need help picking recipes?", 
@@ -194,13 +271,14 @@ if page == "Grocery List Maker":
                                         "For busy evenings",
                                         "Focus on lighter meals",
                                         "Go full veggie",
+                                        "In season now",
                                         "Show favorites"], 
                                        key='sidebar_radio_help_picking')
 
     if suggestion_type == "Show favorites":
             st.sidebar.markdown("These recipes have been **logged the most**:")
             # Per recipe get : Key, freq, avg portoin, label
-            for _, row in df_fav_recipes.iterrows():
+            for _, row in get_fav_recipes().iterrows():
                 recipe_key = row["Recipe"].strip().upper()
                 frequency = row["Frequency"]
                 avg_portion = row["AvgPortion"]
@@ -208,46 +286,42 @@ if page == "Grocery List Maker":
                 st.sidebar.markdown(f"- **{recipe_label}**: {frequency} time(s) with an avg of {avg_portion:.1f} portions/logging")
     
     if suggestion_type == "For busy evenings":
-        fewest_ingredients = sorted(
-                RecipeDict.items(),
-                key=lambda item: len(set(ing["IngredientKey"] for ing in item[1].toDataFrameRows(1)))
-            )
         st.sidebar.markdown("Try these recipes with the **least amount of unique ingredients**:")
-        for key, recipe in fewest_ingredients[:5]:
-            st.sidebar.markdown(f"- **{recipe.getLabel()}**: {len(recipe.toDataFrameRows(1))} ingredients")
+        for key, count in loaded_data.attributes.topK("UniqueIngredients", 5):
+            st.sidebar.markdown(f"- **{RecipeDict[key].getLabel()}**: {count} ingredients")
 
     if suggestion_type == "Focus on lighter meals":
-        kcal_per_recipe = [
-            (name, getRecipeKcal(name))
-            for name in RecipeDict.keys()]
-        lightest_recipes = sorted(kcal_per_recipe, key = lambda x: x[1])[:5]
-
         st.sidebar.markdown("Try these recipes with the **lowest kcal per portion**:")
-        for name, kcal in lightest_recipes:
-            recipe = getRecipe(name)
+        for name, kcal in loaded_data.attributes.topK("KcalPortion", 5):
+            recipe = RecipeDict.get(name)
             label = recipe.getLabel() if recipe else name
             st.sidebar.markdown(f"- **{label}**: {kcal} kcal per portion)")
 
     if suggestion_type == "Go full veggie":
-        # Filter for fully vegetarian recipes
-        veggie_recipes = [
-            name for name in RecipeDict.keys()
-            if is_veggie_recipe(name)
-        ]
-        # Randomly select 5
+        # Randomly select 5 fully vegetarian recipes
+        veggie_recipes = loaded_data.attributes.veggieRecipes()
         selected_veggie_recipes = random.sample(veggie_recipes, 
                                                 k=min(5, len(veggie_recipes)))
 
         st.sidebar.markdown("Try these randomly chosen **veggie** recipes:")
         for name in selected_veggie_recipes:
-            recipe = getRecipe(name)
+            recipe = RecipeDict.get(name)
             label = recipe.getLabel() if recipe else name
             st.sidebar.markdown(f"- {label}")
 
+    if suggestion_type == "In season now":
+        in_season_recipes = loaded_data.seasons.topK(current_month, 5)
+        if in_season_recipes:
+            st.sidebar.markdown("Try these recipes with the **most in-season ingredients** (by weight):")
+            for name, score in in_season_recipes:
+                st.sidebar.markdown(f"- **{RecipeDict[name].getLabel()}**: {score:.0%} in season")
+        else:
+            st.sidebar.markdown("No recipes with in-season ingredients this month.")
+
     # Get a dictionary of all extra ingredients of previous log with key= Ingredient (Amount unit) and value row of dataframe
     last_extra_map = {
                 f"{row['Ingredient']} ({int(row['Amount'])} {row['Unit']})": row
-                for _, row in df_extras_only.iterrows()}
+                for _, row in get_last_extras().iterrows()}
     
     # Get a multiselect list for these prev. extra ingr. and keep track which have already been added
     st.sidebar.subheader("Add extra ingredients from last list")
@@ -264,8 +338,11 @@ if page == "Grocery List Maker":
     # Initialize necessary variables for the extra ingredients
     extra_ingredients = []
     rows_to_keep = []
-    used_ingredients = []
     unit_options = ['u', 'g']
+    # Exclusions as sets: ingredients picked in an earlier row, ingredients of reused extras (kept in session state)
+    used_ingredients = set()
+    reused_ingredients = set(st.session_state.last_extra_ingredients.values())
+    sidebar_row_ids = set(st.session_state.last_extra_ids.values())
 
     for row_id in st.session_state.extra_rows:
         # Skip rendering if the row was marked for deletion
@@ -274,30 +351,23 @@ if page == "Grocery List Maker":
         
         cols = st.columns([4, 2, 2, 1])  
         current_ingr = st.session_state.get(f"ing_{row_id}", "")
-        available_ingredients = sorted([
-            label for label in ingredient_options
-            if (label not in used_ingredients and 
-                label not in [row['Ingredient'] for label, row in last_extra_map.items() if label in st.session_state.selected_last_extras]) 
-            or label == current_ingr])
+        # Filtering the pre-sorted labels keeps them sorted
+        if used_ingredients or reused_ingredients:
+            available_ingredients = [
+                label for label in sorted_ingredient_labels
+                if (label not in used_ingredients and label not in reused_ingredients) or label == current_ingr]
+        else:
+            available_ingredients = sorted_ingredient_labels
 
         if not available_ingredients:
             st.warning("No more ingredients to add.")
             break
 
         # Get all ingredients that have not been added yet displayed
-        ingr_display = {}
-        for ing in available_ingredients:
-            ingr_display[ing] = ing
-                
-        select_options = ["Select an ingredient..."] + list(ingr_display.keys()) 
+        select_options = ["Select an ingredient..."] + available_ingredients
         prev_selection = st.session_state.get(f"ing_{row_id}", "Select an ingredient...")
-
-        for display, original in ingr_display.items():
-            if original == prev_selection:
-                prev_selection_display = display
-                break
-        else:
-            prev_selection_display = "Select an ingredient..."
+        # A known label is always available for its own row
+        prev_selection_display = prev_selection if prev_selection in ingredient_options else "Select an ingredient..."
 
         # Column[0] = Select Ingredient / column[1] = Input number, integer / column[2] = Select unit, default u
         ingr_name = cols[0].selectbox(
@@ -326,14 +396,7 @@ if page == "Grocery List Maker":
         # How to remove? Trash can or through navigation
         with cols[3]:
             # Check if it's from the sidebar multiselect
-            from_sidebar = False
-
-            for label, rid in st.session_state.last_extra_ids.items():
-                if rid == row_id:
-                    from_sidebar = True
-                    break
-
-            if from_sidebar:
+            if row_id in sidebar_row_ids:
                 # Instead of delete button, show notice that this ingredient needs to be deleted by unselecting it in sidebar
                 st.markdown(
                     f"<span style='color: gray; font-size: 0.6em; font-style: italic;'>Unselect ingredient in sidebar to remove</span>",
@@ -361,7 +424,7 @@ if page == "Grocery List Maker":
                 })
                 # Add to used_ingredients only if not reused to prevent duplicate filtering
                 if row_id not in st.session_state.reused_extra_ids:
-                    used_ingredients.append(ingr_name)
+                    used_ingredients.add(ingr_name)
         rows_to_keep.append(row_id)            
     st.session_state.extra_rows = rows_to_keep
 
@@ -371,44 +434,26 @@ if page == "Grocery List Maker":
   
     # output_mode = st.sidebar.radio("Export the recipes?", ["View Here", "Export to Excel"])
 
-    all_data = []
-    concatDF = []
-
-    for recipe, portion in selected.items():
-        data = RecipeDict[recipe].toDataFrameRows(portion)
-        df = pd.DataFrame(data)
-        note = st.session_state.get(f'note_{recipe}', "")  # Get the note for this recipe
-        df_export = df.copy()
-        df_export.insert(0, 'Recipe', recipe.ljust(12))
-        df_export.insert(1, 'Portion', portion)
-        df_export['Notes'] = note  # This will apply the same note to all rows of this recipe
-        concatDF.append(df_export)
+    # One aggregation for both tabs and the export
+    normalize = st.sidebar.checkbox("Merge g and u of the same ingredient", key="normalize_units",
+                                    help="Converts every ingredient to one unit with its gram per unit")
+    notes = {recipe: st.session_state.get(f'note_{recipe}', "") for recipe in selected}
+    grocery_list = loaded_data.matrix.aggregate(selected, extra_ingredients, notes, normalize=normalize)
+    combined = grocery_list.combined
+    has_data = bool(selected or extra_ingredients)
 
     # Tabs
     with tab1:
-        if extra_ingredients:
-            df_extra = pd.DataFrame(extra_ingredients)
-
-        if concatDF:
-            all_data = pd.concat(concatDF, ignore_index=True)
-            all_data["IngredientKey"] = all_data["IngredientKey"].str.strip().str.upper()
-            all_data["Unit"] = all_data["Unit"].str.strip().str.lower()
-
-        if extra_ingredients and concatDF:
-            all_data = pd.concat([all_data, df_extra], ignore_index=True) 
-        elif extra_ingredients:
-            all_data = df_extra
-
-        if extra_ingredients or concatDF:
-            combined = all_data.groupby(["Ingredient", "Unit"], as_index=False).sum()
-            combined = combined[col_seq]
+        if has_data:
             st.dataframe(combined.set_index("Ingredient"), use_container_width=True)
+            if normalize:
+                st.caption(f"Units merged: {len(grocery_list.combined_by_unit)} → {len(combined)} lines "
+                           f"({grocery_list.rowsMerged()} fewer)")
 
     if selected:
         with tab2:
             for recipe, portion in selected.items():
-                df = pd.DataFrame(RecipeDict[recipe].toDataFrameRows(portion))
-                df = df[['Ingredient', 'Amount', 'Unit']]
+                df = grocery_list.forRecipe(recipe)
                 recipe_label = RecipeDict[recipe].getLabel()
 
                 with st.expander(f"{recipe_label} - {portion} portion(s)", expanded=False):
@@ -416,78 +461,65 @@ if page == "Grocery List Maker":
 
     # Export Ingredients and Recipes to one file, separate tabs
     # if output_mode == "Export to Excel":
-  # Determine if there's data to export
-    has_data = False
-    
-    if 'all_data' in globals() and isinstance(all_data, pd.DataFrame):
-        has_data = True
-    if 'concatDF' in globals() and isinstance(concatDF, pd.DataFrame):
-        has_data = True
-
     if has_data:
             st.sidebar.subheader("Display Options")
-            buffer = io.BytesIO()
             today = date.today().isoformat()
             file_path = f'.\Excel_files\Export\Grocery_List_{today}.xlsx'
-            log_file_path = '.\Excel_files\Log\Grocery_List_Log.xlsx'
-    
-            with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
-                any_written = False
-            
-                if not combined.empty:
-                    combined.to_excel(writer, index=False, sheet_name="Combined")
-                    any_written = True
-            
-                if concatDF:
-                    per_recipe_df = pd.concat(concatDF, ignore_index=True)
-                    if not per_recipe_df.empty:
-                        per_recipe_df.to_excel(writer, index=False, sheet_name="Per Recipe")
-                        any_written = True
-            
-                if not any_written:
-                    pd.DataFrame({"Message": ["No data to export"]}).to_excel(writer, index=False, sheet_name="Info")
-                    st.warning("No data to export. Please select some recipes or add ingredients.")
-    
-            buffer.seek(0)
+            per_recipe_df = grocery_list.per_recipe
 
+            if combined.empty and per_recipe_df.empty:
+                st.warning("No data to export. Please select some recipes or add ingredients.")
+
+            # The workbook is only built when the button is clicked
             st.sidebar.download_button(
                     label="Download Excel File",
-                    data=buffer.getvalue(),
+                    data=lambda: build_export_workbook(combined, per_recipe_df),
                     file_name=f"Grocery_List_{today}.xlsx",
                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
                     )
-            # Save to disk
-            with open(file_path, "wb") as f:
-                f.write(buffer.getvalue())
 
+            # Save to disk and log in the background: reruns within the debounce window end in 1 write
+            # Values are bound as defaults, the job runs after this rerun (and maybe others) has finished
+            def write_export(combined=combined, per_recipe_df=per_recipe_df, combined_by_unit=grocery_list.combined_by_unit,
+                             file_path=file_path, today=today):
+                with open(file_path, "wb") as f:
+                    f.write(build_export_workbook(combined, per_recipe_df))
+                if not per_recipe_df.empty:
+                    # Only today's rows are written, an earlier export of today is replaced.
+                    # The log keeps the list per (ingredient, unit), also when the units were merged for display
+                    append_export(log_file_path, per_recipe_df, combined_by_unit, today)
 
-            if 'concatDF' in globals() and isinstance(concatDF, pd.DataFrame):
-                per_recipe_log = pd.concat(concatDF, ignore_index=True)
-                per_recipe_log['ExportDate'] = today
-                
-                combined_log = combined.copy()
-                combined_log['ExportDate'] = today
-    
-                if os.path.exists(log_file_path):
-                    updated_per_recipe_log = pd.concat([all_prev_per_recipe_log, per_recipe_log], ignore_index=True)
-                    updated_combined_log = pd.concat([all_prev_combined_log, combined_log], ignore_index=True)
-                else:
-                    updated_per_recipe_log = per_recipe_log
-                    updated_combined_log = combined_log
-        
-                with pd.ExcelWriter(log_file_path, engine='openpyxl', mode='w') as log_writer:
-                    updated_per_recipe_log.to_excel(log_writer, index=False, sheet_name='Log Per Recipe')
-                    updated_combined_log.to_excel(log_writer, index=False, sheet_name='Log Combined')
-                if not any_written:
-                    st.warning("Nothing to export. Please select some recipes or add ingredients.")
+            # Unchanged list (same hash as the last save or the queued one) => nothing is written
+            export_hash = content_hash(combined, per_recipe_df, grocery_list.combined_by_unit)
+            if not export_worker.submit(today, write_export, content_hash=export_hash):
+                st.sidebar.warning("Export queue is full, the list was not saved. Try again in a moment.")
+            show_export_status(export_worker.status(today))
 
 
 # --- DATA ANALYSIS PAGE (to be implemented) ---
 elif page == "Data Analysis":
     st.title("Grocery List Analysis")
     st.header("Groceries Analysis")
+
+    # Frames used on this page only
+    date_options = get_date_options()
+    all_years = date_options["all_years"]
+    all_months = date_options["all_months"]
+    all_month_names = date_options["all_month_names"]
+    all_dates = date_options["all_dates"]
     st.sidebar.header("Date Filters")
 
+    # The log is kept in the store, Excel is only built when asked for
+    if st.sidebar.button("Prepare log as Excel", key="prepare_log_excel"):
+        log_buffer = io.BytesIO()
+        export_log_to_excel(log_file_path, log_buffer)
+        st.sidebar.download_button(
+                label="Download Log Excel File",
+                data=log_buffer.getvalue(),
+                file_name="Grocery_List_Log.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+
     all_dates_checked = st.sidebar.checkbox("All Dates", value=True)
     if not all_dates_checked:
         selected_years = st.sidebar.multiselect("Year", options=all_years, default=all_years)
@@ -497,25 +529,10 @@ elif page == "Data Analysis":
         month_name_to_num = {name: num for num, name in zip(all_months, all_month_names)}
         selected_month_nums = [month_name_to_num[m] for m in selected_months if m in month_name_to_num]
 
-        # Filter df_log_combined for dates matching the selected year and month
-        if selected_years and selected_month_nums:
-            filtered_dates_df = df_log_combined[
-                df_log_combined["Year"].isin(selected_years) & 
-                df_log_combined["MonthNum"].isin(selected_month_nums)]
-
-        if selected_years and not selected_month_nums:
-            filtered_dates_df = df_log_combined[
-                df_log_combined["Year"].isin(selected_years)]
-            
-        if not selected_years and selected_month_nums:
-            filtered_dates_df = df_log_combined[
-                df_log_combined["MonthNum"].isin(selected_month_nums)]
-        
-        if not selected_years and not selected_month_nums:
-            filtered_dates_df = df_log_combined
-
-        # From these filtered rows, get the unique dates available
-        filtered_dates = sorted(filtered_dates_df["DateOnly"].unique())
+        # From the dates matching the selected years and months (no selection = no filter), get the unique dates available
+        filtered_dates = [export_date for export_date in all_dates
+                          if (not selected_years or export_date.year in selected_years)
+                          and (not selected_month_nums or export_date.month in selected_month_nums)]
         selected_dates = st.sidebar.multiselect("Date", options=filtered_dates, default=filtered_dates)
 
         if not selected_dates:
@@ -526,30 +543,45 @@ elif page == "Data Analysis":
         selected_months = all_month_names
         selected_dates = all_dates
 
-    # Copy Dataframes for Data Analysis (always keep the original)
-    da_df_combined = df_log_combined[df_log_combined["DateOnly"].isin(selected_dates)].copy()
-    da_df_per_recipe = df_log_per_recipe[df_log_per_recipe["DateOnly"].isin(selected_dates)].copy()
-    # Get Ingredient Categories
-    da_df_per_recipe["Ingredient_Cat"] = da_df_per_recipe["Ingredient"].apply(categorize_ingredient)
-    # Convert to Units
-    da_df_per_recipe_u = convert_to_units(da_df_per_recipe, unit_col="Unit", amount_col="Amount")
-    da_df_combined_u = convert_to_units(da_df_combined, unit_col="Unit", amount_col="Amount")
-    # Group and sum amount per Ingredient or per Recipe and Ingredient
-    da_df_combined_group = (
-            da_df_combined.groupby(["IngredientLabel", "Unit"], as_index=False)["Amount"]
-            .agg(['sum','size'])
-            .sort_values(by="IngredientLabel") )
-
-    da_df_per_recipe_group = (
-            da_df_per_recipe.groupby(["RecipeLabel","Portion", "IngredientLabel","Unit"], as_index=False)["Amount"]
-            .agg(['sum','size'])
-            .sort_values(by="RecipeLabel"))
-        
-    da_df_per_recipe_group['RecipeKcal1Port'] = da_df_per_recipe_group.apply(
-            lambda row : getRecipeKcal( row['RecipeLabel'], 1 ), axis = 1)
-        
-    da_df_per_recipe_group['RecipeProtPer100Kcal'] = da_df_per_recipe_group.apply(
-            lambda row : getRecipeProtPer100Kcal( row['RecipeLabel'] ), axis = 1)
+    # Only the part of the history between the first and last selected date is read
+    if all_dates_checked or not selected_dates:
+        df_log_per_recipe, df_log_combined = get_log_frames()
+    else:
+        df_log_per_recipe, df_log_combined = get_log_frames(min(selected_dates), max(selected_dates))
+
+    def build_analysis_frames(selected_dates):
+        # Copy Dataframes for Data Analysis (always keep the original)
+        da_df_combined = df_log_combined[df_log_combined["DateOnly"].isin(selected_dates)].copy()
+        da_df_per_recipe = df_log_per_recipe[df_log_per_recipe["DateOnly"].isin(selected_dates)].copy()
+        # Get Ingredient Categories
+        da_df_per_recipe["Ingredient_Cat"] = categorize_series(da_df_per_recipe["Ingredient"])
+        # Convert to Units
+        da_df_per_recipe_u = convert_to_units(da_df_per_recipe, unit_col="Unit", amount_col="Amount")
+        da_df_combined_u = convert_to_units(da_df_combined, unit_col="Unit", amount_col="Amount")
+        # Group and sum amount per Ingredient or per Recipe and Ingredient
+        da_df_combined_group = (
+                da_df_combined.groupby(["IngredientLabel", "Unit"], as_index=False, observed=True)["Amount"]
+                .agg(['sum','size'])
+                .sort_values(by="IngredientLabel") )
+
+        da_df_per_recipe_group = (
+                da_df_per_recipe.groupby(["RecipeLabel","Portion", "IngredientLabel","Unit"], as_index=False, observed=True)["Amount"]
+                .agg(['sum','size'])
+                .sort_values(by="RecipeLabel"))
+
+        # Join the precomputed nutrition per recipe (1 portion) instead of recomputing it per row
+        da_df_per_recipe_group['RecipeKey'] = da_df_per_recipe_group['RecipeLabel'].str.replace(" ","", regex=False).str.upper()
+        da_df_per_recipe_group = da_df_per_recipe_group.merge(
+                loaded_data.nutrition.toDataFrame()[['RecipeKey', 'RecipeKcal1Port', 'RecipeProtPer100Kcal']],
+                on='RecipeKey', how='left')
+
+        return da_df_combined, da_df_per_recipe, da_df_per_recipe_u, da_df_combined_u, da_df_combined_group, da_df_per_recipe_group
+
+    # Cached per log version and date filter
+    (da_df_combined, da_df_per_recipe, da_df_per_recipe_u, da_df_combined_u,
+     da_df_combined_group, da_df_per_recipe_group) = provide(
+        "analysis_frames", ("analysis_frames", get_log_signature(), tuple(selected_dates)),
+        lambda: build_analysis_frames(selected_dates))
         
     ################################################################
         # VISUALS
@@ -564,13 +596,13 @@ elif page == "Data Analysis":
 
         # Group both by ExportDate and Ingredient
         pr_grouped = (
-            da_df_per_recipe_u.groupby(["ExportDate", "IngredientLabel"])["Amount"]
+            da_df_per_recipe_u.groupby(["ExportDate", "IngredientLabel"], observed=True)["Amount"]
             .sum()
             .reset_index()
             .rename(columns={"Amount": "UsageInRecipeCount"}))
 
         comb_grouped = (
-            da_df_combined_u.groupby(["ExportDate", "IngredientLabel"])["Amount"]
+            da_df_combined_u.groupby(["ExportDate", "IngredientLabel"], observed=True)["Amount"]
             .sum()
             .reset_index()
             .rename(columns={"Amount": "TotalCombinedCount"}))
@@ -651,7 +683,7 @@ elif page == "Data Analysis":
 
         # Get portion once per recipe per date
         recipe_ts = (
-            da_df_per_recipe.groupby(["DateOnly", "RecipeLabel"])["Portion"]
+            da_df_per_recipe.groupby(["DateOnly", "RecipeLabel"], observed=True)["Portion"]
             .first()
             .reset_index())
 
@@ -736,7 +768,7 @@ elif page == "Data Analysis":
         tooltip_data = recipe_ts_filtered.copy()
         tooltip_data["RowOffset"] = (
             tooltip_data
-            .groupby(["DateOnly", "Portion"])
+            .groupby(["DateOnly", "Portion"], observed=True)
             .cumcount())
         # Multiply by factor for spacing value
         tooltip_data["dy_offset"] = tooltip_data["RowOffset"] * 15
@@ -844,7 +876,7 @@ elif page == "Data Analysis":
         st.markdown("This bar chart shows which recipes have the highest number of **unique ingredients**, indicating their complexity or variety.")
 
         # Count unique ingredients per recipe
-        unique_ingredients_df = da_df_per_recipe.groupby("RecipeLabel")["IngredientLabel"].nunique().reset_index(name="UniqueIngredients")
+        unique_ingredients_df = da_df_per_recipe.groupby("RecipeLabel", observed=True)["IngredientLabel"].nunique().reset_index(name="UniqueIngredients")
 
         # Sort descending by unique ingredients
         unique_ingredients_df = unique_ingredients_df.sort_values(by="UniqueIngredients", ascending=False)
@@ -903,12 +935,12 @@ elif page == "Data Analysis":
         st.markdown('This gives an indication of how **popular** a recipe is!')
 
         # Drop duplicate (same recipe on same date)
-        portion_df = da_df_per_recipe.groupby(["RecipeLabel", "ExportDate","Portion"]).size().reset_index()
-        avg_portions_df = portion_df.groupby("RecipeLabel")["Portion"].mean().reset_index(name="AvgPortionsPerSave")
+        portion_df = da_df_per_recipe.groupby(["RecipeLabel", "ExportDate","Portion"], observed=True).size().reset_index()
+        avg_portions_df = portion_df.groupby("RecipeLabel", observed=True)["Portion"].mean().reset_index(name="AvgPortionsPerSave")
 
         # How many times recipe appears in log
         freq_df = portion_df.drop_duplicates(subset=["RecipeLabel", "ExportDate"])
-        freq_df = freq_df.groupby("RecipeLabel").size().reset_index(name='TimesLogged')
+        freq_df = freq_df.groupby("RecipeLabel", observed=True).size().reset_index(name='TimesLogged')
 
         # Merge all together
         visual3_df = avg_portions_df.merge(freq_df, on="RecipeLabel", how="left")
@@ -982,7 +1014,7 @@ elif page == "Data Analysis":
         st.markdown('Also indicates difficulty of the recipe by the **amount of ingredients are used in 1 portion**.')
 
         # Count unique ingredients per recipe
-        ingredients_df = da_df_per_recipe.groupby("RecipeLabel")["Ingredient"].nunique().reset_index(name="UniqueIngredients")            # Drop duplicates to avoid multiple rows per recipe
+        ingredients_df = da_df_per_recipe.groupby("RecipeLabel", observed=True)["Ingredient"].nunique().reset_index(name="UniqueIngredients")            # Drop duplicates to avoid multiple rows per recipe
         scatter_df = da_df_per_recipe_group[["RecipeLabel", "RecipeKcal1Port", "RecipeProtPer100Kcal"]].drop_duplicates()
 
         scatter_df = scatter_df.merge(ingredients_df, on="RecipeLabel", how="left")
@@ -1053,13 +1085,13 @@ elif page == "Data Analysis":
         st.markdown('Compared to the previous graph this plot gives an indication of popularity of the recipe by the **amount of ingredients are used in 1 portion**.')
 
         # Count unique ingredients per recipe & Times logged
-        unique_ingr_df = da_df_per_recipe.groupby("RecipeLabel")["IngredientLabel"].nunique().reset_index(name="UniqueIngredients")            # Drop duplicates to avoid multiple rows per recipe
+        unique_ingr_df = da_df_per_recipe.groupby("RecipeLabel", observed=True)["IngredientLabel"].nunique().reset_index(name="UniqueIngredients")            # Drop duplicates to avoid multiple rows per recipe
         times_logged_df = da_df_per_recipe.drop_duplicates(subset=["RecipeLabel", "ExportDate"])
-        times_logged_df = times_logged_df.groupby("RecipeLabel").size().reset_index(name="TimesLogged")
+        times_logged_df = times_logged_df.groupby("RecipeLabel", observed=True).size().reset_index(name="TimesLogged")
  
         # Step 3: Average portions per save
-        portion_df = da_df_per_recipe.groupby(["RecipeLabel", "ExportDate","Portion"]).size().reset_index()#["Portion"].sum().reset_index()
-        avg_portions_df = portion_df.groupby("RecipeLabel")["Portion"].mean().reset_index(name="AvgPortionsPerSave")
+        portion_df = da_df_per_recipe.groupby(["RecipeLabel", "ExportDate","Portion"], observed=True).size().reset_index()#["Portion"].sum().reset_index()
+        avg_portions_df = portion_df.groupby("RecipeLabel", observed=True)["Portion"].mean().reset_index(name="AvgPortionsPerSave")
 
         # Merge all together
         popularity_df = unique_ingr_df.merge(times_logged_df, on="RecipeLabel", how="left")
@@ -1135,14 +1167,14 @@ elif page == "Data Analysis":
         # Prepare data
         
         # Unique ingredients per recipe
-        unique_ingr_df = da_df_per_recipe.groupby("RecipeLabel")["IngredientLabel"].nunique().reset_index(name="UniqueIngredients")
+        unique_ingr_df = da_df_per_recipe.groupby("RecipeLabel", observed=True)["IngredientLabel"].nunique().reset_index(name="UniqueIngredients")
         
         # Nutrition data
         nutrition_df = da_df_per_recipe_group[["RecipeLabel", "RecipeKcal1Port", "RecipeProtPer100Kcal"]].drop_duplicates()
         
         # Average portions per save
-        portion_df = da_df_per_recipe.groupby(["RecipeLabel", "ExportDate", "Portion"]).size().reset_index()
-        avg_portions_df = portion_df.groupby("RecipeLabel")["Portion"].mean().reset_index(name="AvgPortionsPerSave")
+        portion_df = da_df_per_recipe.groupby(["RecipeLabel", "ExportDate", "Portion"], observed=True).size().reset_index()
+        avg_portions_df = portion_df.groupby("RecipeLabel", observed=True)["Portion"].mean().reset_index(name="AvgPortionsPerSave")
         
         # Merge all
         radar_df = nutrition_df.merge(unique_ingr_df, on="RecipeLabel", how="left")
@@ -1249,7 +1281,7 @@ elif page == "Data Analysis":
 
         # Count occurrences of each ingredient in each category
         ingredient_counts = (
-            da_df_per_recipe.groupby(["Ingredient_Cat", "IngredientLabel"])
+            da_df_per_recipe.groupby(["Ingredient_Cat", "IngredientLabel"], observed=True)
             .size()
             .reset_index(name="Count")
             .sort_values(["Ingredient_Cat", "Count"], ascending=[True, False])
@@ -1311,18 +1343,19 @@ elif page == "Data Analysis":
         st.markdown("This visual gives a instant indication of how the **ingredients relate to each other**.")
         st.markdown("The **thickness of a line** shows how often 2 ingredients **appear together in one recipe**.")
 
-        da_df_per_recipe["IngredientLabel"] = da_df_per_recipe["IngredientLabel"].astype(str)
+        # New frame instead of an in place change: da_df_per_recipe is shared through the cache
+        da_df_per_recipe = da_df_per_recipe.assign(IngredientLabel=da_df_per_recipe["IngredientLabel"].astype(str))
 
         # --- Step 1: Get top ingredients overall ---
         ingredient_usage = (
-            da_df_per_recipe.groupby("IngredientLabel")
+            da_df_per_recipe.groupby("IngredientLabel", observed=True)
             .size()
             .reset_index(name="Count")
             .sort_values("Count", ascending=False)
         )
 
         ingredient_usage = (
-            da_df_per_recipe.groupby("IngredientLabel")
+            da_df_per_recipe.groupby("IngredientLabel", observed=True)
             .size()
             .reset_index(name="Count")
             .sort_values("Count", ascending=False)
@@ -1342,7 +1375,7 @@ elif page == "Data Analysis":
         # Filter to only those ingredients in recipes
         recipe_ingredients = (
             da_df_per_recipe[da_df_per_recipe["IngredientLabel"].isin(ingredients_to_use)]
-            .groupby("Recipe")["IngredientLabel"]
+            .groupby("Recipe", observed=True)["IngredientLabel"]
             .apply(list)
             .reset_index(name='Ingredients')#(drop=True)
         )
@@ -1431,7 +1464,7 @@ elif page == "Data Analysis":
         "Sum of All Ingredients for All Dates"])
 
     recipes_by_date = (
-        da_df_per_recipe.groupby(["ExportDate", "RecipeLabel", "Portion"])
+        da_df_per_recipe.groupby(["ExportDate", "RecipeLabel", "Portion"], observed=True)
         .size()
         .reset_index(name="Frequency")  )
 
@@ -1443,11 +1476,11 @@ elif page == "Data Analysis":
                 st.dataframe(df_table.rename(columns={'RecipeLabel':'Recipe','IngredientLabel':'Ingredient'}).set_index("Recipe"), use_container_width=True)
 
     with tab_comb_by_date:
-        grouped_by_date = da_df_combined.groupby("ExportDate")
+        grouped_by_date = da_df_combined.groupby("ExportDate", observed=True)
         
         for export_date, group in sorted(grouped_by_date, reverse=True):
             group_df = (
-            group.groupby(["IngredientLabel", "Unit"], as_index=False)["Amount"]
+            group.groupby(["IngredientLabel", "Unit"], as_index=False, observed=True)["Amount"]
             .sum()
             .sort_values(by="IngredientLabel")
             )
@@ -1457,3 +1490,22 @@ elif page == "Data Analysis":
 
     with tab_sum_all:
         st.dataframe(da_df_combined_group[["IngredientLabel", "sum", "Unit"]].rename(columns={'IngredientLabel':'Ingredient'}).set_index("Ingredient").rename(columns={'sum':'Sum of Amount'}) , use_container_width=True)
+
+# Cost of this page: per provider and for the whole script (for both "pages").
+# Kept per session: the last rerun of each page by this user, not by whoever reran last
+page_timings = st.session_state.setdefault("page_timings", {})
+page_timings[page] = (time.perf_counter() - script_start) * 1000
+with st.sidebar.expander("Page timings"):
+    st.markdown("\n".join(
+        [f"- {name}: {ms:.1f} ms{' (cached)' if cached else ''}" for name, ms, cached in run_timings] +
+        [f"- **Last rerun of {name}: {ms:.0f} ms**" for name, ms in page_timings.items()]))
+
+# Shared cache statistics (for both "pages")
+with st.sidebar.expander("Cache statistics"):
+    cache_stats = shared_cache.stats()
+    st.markdown(f"- Hits: **{cache_stats['hits']}**\n"
+                f"- Misses: **{cache_stats['misses']}** (hit rate {cache_stats['hit_rate']:.0%})\n"
+                f"- Entries: **{cache_stats['entries']}** ({cache_stats['size_mb']:.1f} MB, {cache_stats['evictions']} evicted)")
+    export_stats = export_worker.stats()
+    st.markdown(f"- Export writes: **{export_stats['writes']}** "
+                f"({export_stats['skipped']} skipped as unchanged, {export_stats['coalesced']} coalesced)")
@@ -0,0 +1,129 @@
+# scrape_nutrition_batch and fetch_with_retries against a local stub server serving saved product pages
+# (Colruyt_scraping/fixtures). Each path can be told to fail with a list of status codes before serving its page.
+
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from Colruyt_scraping import colruyt_scraper
+
+FIXTURES = os.path.join(os.path.dirname(colruyt_scraper.__file__), "fixtures")
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+# path => page served with status 200
+PAGES = {
+    "/spaghetti": "product_nutrition.html",
+    "/keukenrol": "product_no_nutrition.html",
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = {}       # path => status codes to answer first, consumed one per request
+    hits = {}           # path => number of requests
+
+    def do_GET(self):
+        self.hits[self.path] = self.hits.get(self.path, 0) + 1
+        pending = self.failures.get(self.path)
+        if pending:
+            self.reply(pending.pop(0), b"")
+        elif self.path in PAGES:
+            self.reply(200, fixture(PAGES[self.path]))
+        else:
+            self.reply(404, b"not found")
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub():
+    StubHandler.failures, StubHandler.hits = {}, {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Backoff waits, recorded instead of slept
+    waits = []
+    monkeypatch.setattr(colruyt_scraper.time, "sleep", waits.append)
+    return waits
+
+
+def test_parse_saved_page():
+    data = colruyt_scraper.parse_nutritional_data(fixture("product_nutrition.html").decode())
+    values = dict(zip(data["Nutrition"], data["Value"]))
+    assert values["Energie kcal"] == "352"
+    assert values["Zout"] == "0.01"
+    # Stops before the per portion values
+    assert list(data["Nutrition"]).count("Energie kJ") == 1
+    assert colruyt_scraper.get_kcal_prot(data) == (352.0, 13.0)
+
+def test_kcal_from_kj():
+    data = colruyt_scraper.pd.DataFrame({"Nutrition": ["Energie kJ", "Eiwitten"], "Value": ["418,4", "2,5"]})
+    assert colruyt_scraper.get_kcal_prot(data) == pytest.approx((100.0, 2.5))
+
+def test_batch_results(stub, sleeps):
+    df = colruyt_scraper.scrape_nutrition_batch(
+        [{"SPAGHETTI": f"{stub}/spaghetti"}, {"KEUKENROL": f"{stub}/keukenrol"},
+         {"ONBEKEND": f"{stub}/missing"}, {"ZONDER URL": None}],
+        rate_per_host=0)
+    assert list(df.index) == ["SPAGHETTI", "KEUKENROL", "ONBEKEND", "ZONDER URL"]
+    assert df.loc["SPAGHETTI", ["kcal_100g", "prot_100g"]].tolist() == [352.0, 13.0]
+    assert df["status"].tolist() == ["ok", "no data", "http 404", "no url"]
+    assert df["attempts"].tolist() == [1, 1, 1, 0]
+    assert df[["kcal_100g", "prot_100g"]].iloc[1:].isna().all().all()
+    # A 404 is an answer, not a failure to retry
+    assert StubHandler.hits["/missing"] == 1
+    assert sleeps == []
+
+def test_retries_with_backoff(stub, sleeps):
+    StubHandler.failures = {"/spaghetti": [429, 503]}
+    df = colruyt_scraper.scrape_nutrition_batch({"SPAGHETTI": f"{stub}/spaghetti"},
+                                                rate_per_host=0, retries=3, backoff=0.5)
+    row = df.loc["SPAGHETTI"]
+    assert (row["status"], row["attempts"], row["kcal_100g"]) == ("ok", 3, 352.0)
+    assert StubHandler.hits["/spaghetti"] == 3
+    assert sleeps == [0.5, 1.0]
+
+def test_retries_exhausted(stub, sleeps):
+    StubHandler.failures = {"/spaghetti": [500, 502, 503]}
+    df = colruyt_scraper.scrape_nutrition_batch({"SPAGHETTI": f"{stub}/spaghetti"},
+                                                rate_per_host=0, retries=2, backoff=0.1)
+    row = df.loc["SPAGHETTI"]
+    assert (row["status"], row["attempts"], row["error"]) == ("failed", 3, "HTTP 503")
+    assert sleeps == [0.1, 0.2]
+
+def test_connection_error_is_retried(sleeps):
+    with requests.Session() as session:
+        response, attempts, error = colruyt_scraper.fetch_with_retries(
+            session, "http://127.0.0.1:1/product", retries=1, backoff=0.25, timeout=2)
+    assert response is None and attempts == 2
+    assert "Connection" in error
+    assert sleeps == [0.25]
+
+def test_fetch_with_retries_uses_limiter(stub, sleeps):
+    waited = []
+    class Limiter:
+        def wait(self, url):
+            waited.append(url)
+    StubHandler.failures = {"/spaghetti": [503]}
+    with requests.Session() as session:
+        response, attempts, error = colruyt_scraper.fetch_with_retries(
+            session, f"{stub}/spaghetti", Limiter(), retries=3, backoff=0.5)
+    assert (response.status_code, attempts, error) == (200, 2, None)
+    assert waited == [f"{stub}/spaghetti"] * 2
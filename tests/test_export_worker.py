@@ -0,0 +1,26 @@
+# ExportWorker: debounced jobs still waiting when the process exits are written by the atexit flush
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def test_pending_job_written_on_exit(tmp_path):
+    target = tmp_path / "export.txt"
+    script = (
+        "from export_worker import ExportWorker\n"
+        "worker = ExportWorker(debounce=60)\n"
+        f"worker.submit('today', lambda: open({str(target)!r}, 'w').write('saved'))\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, timeout=60)
+    assert target.read_text() == "saved"
+
+def test_flush_runs_pending_jobs():
+    from export_worker import ExportWorker
+    written = []
+    worker = ExportWorker(debounce=60)
+    worker.submit("today", lambda: written.append(1))
+    assert worker.flush(timeout=5)
+    assert written == [1]
+    assert worker.status("today")["state"] == "done"
@@ -0,0 +1,33 @@
+# refresh_prices: prices dated from a file modification time are compared with pd.Timestamp.now() (local time)
+
+import time
+
+import pandas as pd
+import pytest
+
+from Colruyt_scraping import colruyt_scraper_price
+
+@pytest.fixture
+def utc_plus_5(monkeypatch):
+    # A time zone well away from UTC, so an age computed against UTC is off by hours
+    monkeypatch.setenv("TZ", "Etc/GMT-5")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+def test_legacy_file_dated_in_local_time(tmp_path, utc_plus_5):
+    save_path = str(tmp_path / "prices.xlsx")
+    pd.DataFrame({"Ingredient": ["SPAGHETTI"], "url": ["http://shop/spaghetti"], "price": ["1.49"]}).to_excel(save_path, index=False)
+    history = colruyt_scraper_price.read_price_history(save_path)
+    assert abs(pd.Timestamp.now() - history.loc[0, "ScrapedAt"]) < pd.Timedelta(minutes=1)
+
+def test_fresh_legacy_price_is_not_scraped(tmp_path, utc_plus_5, monkeypatch):
+    save_path = str(tmp_path / "prices.xlsx")
+    pd.DataFrame({"Ingredient": ["SPAGHETTI"], "url": ["http://shop/spaghetti"], "price": ["1.49"]}).to_excel(save_path, index=False)
+    def scrape(*args, **kwargs):
+        raise AssertionError("a price saved just now is not stale")
+    monkeypatch.setattr(colruyt_scraper_price, "scrape_all_prices_parallel", scrape)
+    # 4 hours is within the UTC offset: an age measured against UTC would make the price 5 hours old
+    current = colruyt_scraper_price.refresh_prices({"SPAGHETTI": "http://shop/spaghetti"}, save_path, max_age_days=4 / 24)
+    assert current.attrs["refreshed"] == 0
@@ -0,0 +1,50 @@
+# Streaming xlsx writer
+# pd.ExcelWriter(engine="openpyxl") builds the whole workbook (every cell object) in memory before saving.
+# Here sheets are written with openpyxl in write_only mode from iterables of rows: each row is serialized as soon
+# as it is appended, so memory depends on the chunk size of the row source, not on the number of rows.
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+# Same header look as DataFrame.to_excel
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style="thin"), right=Side(style="thin"), top=Side(style="thin"), bottom=Side(style="thin"))
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+def clean_value(value):
+    # Empty cell for NaN/NaT/None, plain Python types for numpy scalars
+    if value is None or value is pd.NaT or (isinstance(value, (float, np.generic, pd.Timestamp)) and pd.isna(value)):
+        return None
+    if isinstance(value, np.datetime64):
+        return pd.Timestamp(value).to_pydatetime()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def dataframe_rows(df, chunk_size=10_000):
+    """Rows of a DataFrame as tuples, converted chunk_size rows at a time"""
+    for start in range(0, len(df), chunk_size):
+        yield from df.iloc[start:start + chunk_size].itertuples(index=False, name=None)
+
+def write_xlsx(target, sheets):
+    """Write sheets to target (path or BytesIO) in write_only mode.
+    sheets: iterable of (sheet name, columns, rows), rows being any iterable of tuples (a generator is consumed once)."""
+    workbook = Workbook(write_only=True)
+    any_sheet = False
+    for sheet_name, columns, rows in sheets:
+        worksheet = workbook.create_sheet(title=sheet_name)
+        header = []
+        for col in columns:
+            cell = WriteOnlyCell(worksheet, value=col)
+            cell.font, cell.border, cell.alignment = HEADER_FONT, HEADER_BORDER, HEADER_ALIGNMENT
+            header.append(cell)
+        worksheet.append(header)
+        for row in rows:
+            worksheet.append([clean_value(value) for value in row])
+        any_sheet = True
+    if not any_sheet:
+        raise ValueError("At least one sheet is needed to write an xlsx file")
+    workbook.save(target)